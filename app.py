@@ -4,12 +4,13 @@
 import os
 import sys
 import io
-import pymysql
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from backend.config import config
-from backend.extensions import db, bcrypt
+from backend.extensions import db, bcrypt, cache
 from backend.models import Book, User, Category, Publisher, Member # Import models
+from backend.utils import check_database_connection
+from backend.json_provider import FastJSONProvider
 
 # Suppress fileno errors in cPanel environment
 import warnings
@@ -57,6 +58,7 @@ config_name = os.environ.get('APP_ENV') or os.environ.get('FLASK_ENV', 'developm
 # Initialize Flask app
 app = Flask(__name__)
 app.config.from_object(config[config_name])
+app.json = FastJSONProvider(app)  # orjson when installed, stdlib otherwise
 
 # Check if ProductionConfig is being used but database URI is None
 if config_name == 'production' and app.config.get('SQLALCHEMY_DATABASE_URI') is None:
@@ -74,6 +76,7 @@ if config_name == 'production' and app.config.get('SQLALCHEMY_DATABASE_URI') is
 # Initialize extensions with the app
 db.init_app(app)
 bcrypt.init_app(app)
+cache.init_app(app)
 CORS(app)  # Enable CORS for frontend integration
 
 # Add error handlers for database issues
@@ -97,6 +100,15 @@ def close_db_session(error):
 @app.errorhandler(Exception)
 def handle_database_errors(error):
     """Handle database connection errors gracefully"""
+    from flask import jsonify
+    from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+    # Pool checkout timed out: the connections are fine, just busy - don't dispose them
+    if isinstance(error, PoolTimeoutError):
+        response = jsonify({"error": "Server is busy, please try again in a moment"})
+        response.headers['Retry-After'] = str(app.config.get('ADMISSION_RETRY_AFTER_SECONDS', 2))
+        return response, 503
+
     error_str = str(error).lower()
     
     # Check for various database connection issues
@@ -115,53 +127,21 @@ def handle_database_errors(error):
     if any(err in error_str for err in db_connection_errors):
         print(f"Database connection error handled: {error}")
         
-        # Attempt to recover the connection
+        # Attempt to recover the session; the broken connection itself was
+        # already invalidated, so the rest of the pool is left alone
         try:
             db.session.rollback()
             db.session.remove()
-            # Try to create a new session
-            db.session.close()
-            # Safely dispose of connection pool
-            if hasattr(db.session, 'bind') and db.session.bind and hasattr(db.session.bind, 'pool'):
-                db.session.bind.pool.dispose()
         except Exception as recovery_error:
             print(f"Error during connection recovery: {recovery_error}")
         
         # Return a user-friendly error response
-        from flask import jsonify
         return jsonify({"error": "Database connection issue, please try again in a moment"}), 503
     raise error
 
-def check_database_connection():
-    """Check if database connection is healthy and recover if needed"""
-    try:
-        # Test the connection with a simple query using text()
-        from sqlalchemy import text
-        db.session.execute(text('SELECT 1'))
-        db.session.commit()
-        return True
-    except Exception as e:
-        print(f"Database connection check failed: {e}")
-        try:
-            # Attempt to recover the connection
-            db.session.rollback()
-            db.session.remove()
-            db.session.close()
-            # Safely dispose of connection pool
-            if hasattr(db.session, 'bind') and db.session.bind and hasattr(db.session.bind, 'pool'):
-                db.session.bind.pool.dispose()
-            # Test again after cleanup
-            from sqlalchemy import text
-            db.session.execute(text('SELECT 1'))
-            db.session.commit()
-            print("Database connection recovered successfully")
-            return True
-        except Exception as recovery_error:
-            print(f"Database connection recovery failed: {recovery_error}")
-            return False
-
 def ensure_database_exists():
     """Create database if it doesn't exist - UNIFIED for all environments"""
+    import pymysql  # only needed here, during bootstrap
     connection = None
     cursor = None
     try:
@@ -211,15 +191,52 @@ def ensure_database_exists():
 # Import and register routes after app and db are initialized to avoid circular imports
 from backend.routes import register_routes
 from backend.auth_routes import register_auth_routes
+from backend.replica import register_replica_routing
+from backend.pool import register_pool_manager
+from backend.timeouts import register_statement_timeouts
+from backend.admission import register_admission_control
+from backend.retry import register_disconnect_handling
+from backend.transaction import register_unit_of_work
+from backend.bootstrap import bootstrap_database, needs_bootstrap, SCHEMA_VERSION
+from backend.profiling import register_profiling_commands
+from backend.compression import register_compression
+from backend.assets import load_manifest, send_built_asset, register_asset_commands
+from backend.log_archive import register_log_archive_commands
+from backend.schema import ensure_core_schema
+from backend.log_search import ensure_log_schema
+from backend.changes import ensure_change_schema, register_change_commands
+from backend.purge import register_purge_commands
 
 # Register all routes
 register_routes(app)
 register_auth_routes(app)
+register_compression(app)  # first after_request registered runs last, after the body is final
+register_replica_routing(app)
+register_pool_manager(app, db)
+register_statement_timeouts(app, db)  # before admission control, so queueing counts against the budget
+register_admission_control(app)
+register_disconnect_handling(app, db)
+register_unit_of_work(app, db)
+register_profiling_commands(app)
+register_asset_commands(app)
+register_log_archive_commands(app)
+register_change_commands(app)
+register_purge_commands(app)
 
 # --- STATIC FILE SERVING ROUTES ---
+# Built assets (flask build-assets) are served when present, the sources otherwise
+ASSET_BUILD_DIR = os.path.join(app.root_path, app.config.get('STATIC_BUILD_DIR', 'dist'))
+asset_manifest = load_manifest(ASSET_BUILD_DIR) if app.config.get('STATIC_USE_BUILD', True) else None
+built_assets = set(asset_manifest.values()) if asset_manifest else set()
+
 @app.route('/')
 def serve_main_app():
     """Serve the main Library Management System application"""
+    if asset_manifest:
+        # Always revalidated: it names the current fingerprinted assets
+        response = send_from_directory(ASSET_BUILD_DIR, 'index.html')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     return send_from_directory('.', 'index.html')
 
 @app.route('/favicon.ico')
@@ -230,6 +247,10 @@ def favicon():
 def serve_static_files(filename):
     """Serve static files (CSS, JS, images)"""
     # This is a simple way; for high performance, Apache/Nginx should handle this.
+    if asset_manifest:
+        response = send_built_asset(ASSET_BUILD_DIR, filename, built_assets)
+        if response is not None:
+            return response
     return send_from_directory('.', filename)
 # --- END OF STATIC FILE SERVING ---
 
@@ -370,6 +391,11 @@ def initialize_database():
             db.create_all()
             print("Database tables created with db.create_all()")
 
+            # Columns and indexes added after the tables first shipped
+            ensure_core_schema(db.engine)
+            ensure_log_schema(db.engine, fulltext=app.config.get('LOG_FULLTEXT_SEARCH', True))
+            ensure_change_schema(db.engine)
+
             # Create admin user
             create_admin_user()
 
@@ -380,16 +406,31 @@ def initialize_database():
                 print("Sample data created.")
 
         print("Database initialization completed")
+        return True
         
     except Exception as e:
         print(f"Database initialization error: {e}")
         # Don't raise the exception - let the app continue
         # This prevents the app from crashing during startup
+        return False
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create tables, admin user and sample data (run once per deployment)"""
+    if bootstrap_database(app, initialize_database, force=True):
+        print(f"Database bootstrapped (schema version {SCHEMA_VERSION})")
+    else:
+        print("Database bootstrap failed, see errors above")
+        sys.exit(1)
 
 if __name__ == '__main__':
     # This block runs only when you execute "python app.py" locally
-    initialize_database()
+    if len(sys.argv) > 1 and sys.argv[1] == 'init-db':
+        sys.exit(0 if bootstrap_database(app, initialize_database, force=True) else 1)
+    bootstrap_database(app, initialize_database)
     app.run(debug=False, host='0.0.0.0', port=5002)
-else:
-    # This runs when deployed (like in cPanel)
-    initialize_database()
+elif app.config.get('AUTO_BOOTSTRAP_DATABASE', True) and needs_bootstrap(app):
+    # Deployed import (like in cPanel): only reads the schema marker once
+    # `flask --app app init-db` has run; otherwise the first worker bootstraps
+    # under the lock and the others wait for it
+    bootstrap_database(app, initialize_database)
@@ -0,0 +1,10 @@
+#
+# Optional ASGI entry point: async read endpoints, Flask for everything else
+#
+#   pip install -r requirements-async.txt
+#   uvicorn asgi:application --host 0.0.0.0 --port 5002
+#
+from app import app
+from backend.async_reads import create_asgi_app
+
+application = create_asgi_app(app)
@@ -0,0 +1,73 @@
+#
+# Structured activity: which entities each library log entry concerns
+#
+# Every entry written through log_activity() records its main entity, the
+# acting user and a JSON payload on the library_log row, and one log_entity
+# row per entity involved (an issue concerns both the book and the member).
+# The log_entity primary key (entity_type, entity_id, log_id) makes an
+# entity's timeline a single index range scan, paged by log id.
+#
+from flask import g, has_request_context
+from sqlalchemy import insert, select
+from .extensions import db
+from .models import LibraryLog, LogEntity
+
+ACTIVITY_PAGE_SIZE = 50
+MAX_ACTIVITY_PAGE_SIZE = 200
+
+
+def entity_ref(entity):
+    """(entity_type, entity_id) for a model instance or an existing pair"""
+    if isinstance(entity, tuple):
+        return entity
+    return type(entity).__name__.lower(), entity.id
+
+
+def log_activity(content, log_type='General', entity=None, related=(), payload=None):
+    """Add a LibraryLog entry about ``entity``, also listed in the ``related`` entities' timelines"""
+    primary = entity_ref(entity) if entity is not None else (None, None)
+    refs = []
+    for ref in ([entity] if entity is not None else []) + list(related):
+        ref = entity_ref(ref)
+        if ref not in refs:
+            refs.append(ref)
+
+    actor = g.get('current_user') if has_request_context() else None
+    log = LibraryLog(
+        content=content,
+        log_type=log_type,
+        entity_type=primary[0],
+        entity_id=primary[1],
+        actor_id=actor.id if actor is not None else None,
+        payload=payload
+    )
+    db.session.add(log)
+    if refs:
+        db.session.flush()
+        db.session.execute(insert(LogEntity), [
+            {'entity_type': entity_type, 'entity_id': entity_id, 'log_id': log.id}
+            for entity_type, entity_id in refs
+        ])
+    return log
+
+
+def activity_page(entity_type, entity_id, before=None, limit=ACTIVITY_PAGE_SIZE):
+    """One page of an entity's activity, newest first, and the cursor for the next page"""
+    limit = max(1, min(limit, MAX_ACTIVITY_PAGE_SIZE))
+    query = (
+        select(LibraryLog)
+        .join(LogEntity, LogEntity.log_id == LibraryLog.id)
+        .where(LogEntity.entity_type == entity_type, LogEntity.entity_id == entity_id)
+        .order_by(LogEntity.log_id.desc())
+        .limit(limit + 1)
+    )
+    if before is not None:
+        query = query.where(LogEntity.log_id < before)
+
+    logs = db.session.execute(query).scalars().all()
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+    return {
+        'activity': [log.to_dict() for log in logs],
+        'next_before': logs[-1].id if has_more else None
+    }
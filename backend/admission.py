@@ -0,0 +1,152 @@
+#
+# Admission control: bounded concurrency in front of the database pool
+#
+import itertools
+import threading
+import time
+from collections import Counter
+from flask import request, jsonify, g
+
+# Lower rank is served first when slots free up
+PRIORITY_RANKS = {'circulation': 0, 'write': 1, 'read': 2, 'low': 3}
+
+
+class AdmissionController:
+    """Counts running API requests and queues or sheds the excess.
+
+    A request runs when a global slot is free, its route is under its own
+    limit and, for low-priority work, the low-priority share is not used up.
+    Otherwise it waits in a short queue ordered by priority until its
+    deadline; when the queue is full or the deadline passes it is rejected.
+    """
+
+    def __init__(self, max_concurrent, queue_size, route_limits=None, low_priority_slots=1):
+        self.max_concurrent = max_concurrent
+        self.queue_size = queue_size
+        self.route_limits = route_limits or {}
+        self.low_priority_slots = low_priority_slots
+        self._cond = threading.Condition()
+        self._active = 0
+        self._active_low = 0
+        self._active_by_route = Counter()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self.rejected = 0
+
+    def _can_run(self, route, priority):
+        if self._active >= self.max_concurrent:
+            return False
+        if self._active_by_route[route] >= self.route_limits.get(route, self.max_concurrent):
+            return False
+        if priority == 'low' and self._active_low >= self.low_priority_slots:
+            return False
+        return True
+
+    def _is_next(self, entry):
+        """No better-ranked waiter that could run right now is ahead of ``entry``"""
+        for other in self._waiting:
+            if other < entry and self._can_run(other[2], other[3]):
+                return False
+        return True
+
+    def _take(self, route, priority):
+        self._active += 1
+        self._active_by_route[route] += 1
+        if priority == 'low':
+            self._active_low += 1
+
+    def acquire(self, route, priority, timeout):
+        """Wait up to ``timeout`` seconds for a slot. Returns False if the request should be shed."""
+        with self._cond:
+            if not self._waiting and self._can_run(route, priority):
+                self._take(route, priority)
+                return True
+            if len(self._waiting) >= self.queue_size:
+                self.rejected += 1
+                return False
+
+            entry = (PRIORITY_RANKS[priority], next(self._sequence), route, priority)
+            self._waiting.append(entry)
+            deadline = time.monotonic() + timeout
+            try:
+                while True:
+                    if self._is_next(entry) and self._can_run(route, priority):
+                        self._take(route, priority)
+                        return True
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting.remove(entry)
+                self._cond.notify_all()
+
+    def release(self, route, priority):
+        with self._cond:
+            self._active -= 1
+            self._active_by_route[route] -= 1
+            if priority == 'low':
+                self._active_low -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'active': self._active,
+                'queued': len(self._waiting),
+                'rejected': self.rejected,
+                'max_concurrent': self.max_concurrent,
+                'queue_size': self.queue_size
+            }
+
+
+def classify_request(route, method, config):
+    """Priority class for a request: circulation > other writes > reads > exports and reports"""
+    if route in config.get('ADMISSION_CIRCULATION_ROUTES', ()):
+        return 'circulation'
+    if method not in ('GET', 'HEAD', 'OPTIONS'):
+        return 'write'
+    if route in config.get('ADMISSION_LOW_PRIORITY_ROUTES', ()):
+        return 'low'
+    return 'read'
+
+
+def register_admission_control(app):
+    """Admit /api/ requests through an AdmissionController; shed the excess with 503 + Retry-After"""
+    if not app.config.get('ADMISSION_ENABLED', True):
+        return None
+
+    controller = AdmissionController(
+        max_concurrent=app.config.get('ADMISSION_MAX_CONCURRENT', 4),
+        queue_size=app.config.get('ADMISSION_QUEUE_SIZE', 20),
+        route_limits=app.config.get('ADMISSION_ROUTE_LIMITS'),
+        low_priority_slots=app.config.get('ADMISSION_LOW_PRIORITY_SLOTS', 1)
+    )
+    queue_timeouts = app.config.get('ADMISSION_QUEUE_TIMEOUTS', {})
+    retry_after = str(app.config.get('ADMISSION_RETRY_AFTER_SECONDS', 2))
+    exempt = set(app.config.get('ADMISSION_EXEMPT_PATHS', ()))
+    app.extensions['admission'] = controller
+
+    @app.before_request
+    def admit_request():
+        if not request.path.startswith('/api/') or request.path in exempt or request.url_rule is None:
+            return None
+
+        route = f'{request.method} {request.url_rule.rule}'
+        priority = classify_request(route, request.method, app.config)
+        if not controller.acquire(route, priority, queue_timeouts.get(priority, 1.0)):
+            response = jsonify({'error': 'Server is busy, please try again in a moment'})
+            response.status_code = 503
+            response.headers['Retry-After'] = retry_after
+            return response
+        g.admission_slot = (route, priority)
+        return None
+
+    @app.teardown_request
+    def release_admission_slot(error):
+        slot = g.pop('admission_slot', None)
+        if slot:
+            controller.release(*slot)
+
+    return controller
@@ -0,0 +1,127 @@
+#
+# Static asset build: fingerprinted, precompressed css/ and js/ files
+#
+# `flask --app app build-assets` copies every asset into STATIC_BUILD_DIR
+# under a content-hashed name (css/style.3f2a9c1b04.css), writes .gz and
+# .br siblings, and rewrites index.html to point at them. Fingerprinted
+# files never change, so they are served with an immutable one-year
+# Cache-Control and repeat visits make no asset requests at all; only
+# index.html is revalidated.
+#
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import request, send_from_directory
+
+from .compression import brotli, choose_encoding
+
+ASSET_DIRS = ('css', 'js')
+ASSET_EXTENSIONS = ('.css', '.js', '.json')
+MANIFEST_NAME = 'manifest.json'
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# href="css/..." / src="js/..." references in index.html
+ASSET_REFERENCE = re.compile(r'''(href|src)=(["'])((?:css|js)/[^"'?#]+)\2''')
+
+
+def fingerprinted_name(path, content):
+    """css/style.css -> css/style.<10 hex digits of sha256>.css"""
+    root, ext = os.path.splitext(path)
+    return f'{root}.{hashlib.sha256(content).hexdigest()[:10]}{ext}'
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as output:
+        output.write(content)
+
+
+def build_assets(source_root, build_dir):
+    """Build the fingerprinted asset tree; returns the {original: fingerprinted} manifest"""
+    if os.path.isdir(build_dir):
+        shutil.rmtree(build_dir)
+
+    manifest = {}
+    for asset_dir in ASSET_DIRS:
+        for directory, _, filenames in os.walk(os.path.join(source_root, asset_dir)):
+            for filename in sorted(filenames):
+                if not filename.endswith(ASSET_EXTENSIONS):
+                    continue
+                source = os.path.join(directory, filename)
+                relative = os.path.relpath(source, source_root).replace(os.sep, '/')
+                with open(source, 'rb') as asset:
+                    content = asset.read()
+
+                target = fingerprinted_name(relative, content)
+                _write(os.path.join(build_dir, target), content)
+                _write(os.path.join(build_dir, target + '.gz'), gzip.compress(content, 9, mtime=0))
+                if brotli is not None:
+                    _write(os.path.join(build_dir, target + '.br'), brotli.compress(content, quality=11))
+                manifest[relative] = target
+
+    with open(os.path.join(source_root, 'index.html'), 'r', encoding='utf-8') as page:
+        html = page.read()
+    html = ASSET_REFERENCE.sub(
+        lambda m: f'{m.group(1)}={m.group(2)}{manifest.get(m.group(3), m.group(3))}{m.group(2)}', html
+    )
+    # Language files are fetched by i18n.js at runtime; give it their built names
+    languages = {path: built for path, built in manifest.items() if path.startswith('js/languages/')}
+    html = html.replace(
+        '<script src=',
+        f'<script>window.ASSET_MANIFEST = {json.dumps(languages)};</script>\n    <script src=',
+        1
+    )
+    _write(os.path.join(build_dir, 'index.html'), html.encode('utf-8'))
+
+    with open(os.path.join(build_dir, MANIFEST_NAME), 'w', encoding='utf-8') as output:
+        json.dump(manifest, output, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(build_dir):
+    """The manifest of a previous build, or None if assets have not been built"""
+    try:
+        with open(os.path.join(build_dir, MANIFEST_NAME), 'r', encoding='utf-8') as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return None
+
+
+def send_built_asset(build_dir, filename, built_files):
+    """Serve a fingerprinted file, precompressed when the client allows; None if not a built asset"""
+    if filename not in built_files:
+        return None
+
+    encoding = choose_encoding(request.accept_encodings)
+    extension = {'br': '.br', 'gzip': '.gz'}.get(encoding)
+    if extension and not os.path.exists(os.path.join(build_dir, filename + extension)):
+        encoding, extension = ('gzip', '.gz') if encoding == 'br' else (None, None)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    if encoding:
+        response = send_from_directory(build_dir, filename + extension, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = send_from_directory(build_dir, filename, mimetype=mimetype)
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def register_asset_commands(app):
+    """Add `flask build-assets`"""
+
+    @app.cli.command('build-assets')
+    def build_assets_command():
+        """Fingerprint, precompress and link the css/ and js/ assets"""
+        build_dir = os.path.join(app.root_path, app.config.get('STATIC_BUILD_DIR', 'dist'))
+        manifest = build_assets(app.root_path, build_dir)
+        print(f"Built {len(manifest)} assets into {build_dir}")
+        if brotli is None:
+            print("brotli not installed: wrote .gz files only")
+        print("Restart the application to serve the new build")
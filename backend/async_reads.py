@@ -0,0 +1,286 @@
+#
+# Optional async serving mode: read-heavy GET endpoints on an async engine,
+# everything else handed to the regular Flask app.
+#
+# Requires the packages in requirements-async.txt. Run with e.g.
+#     uvicorn asgi:application --workers 1
+#
+# The async handlers compress their bodies with the COMPRESS_* settings and
+# are cut off at their STATEMENT_TIMEOUTS budget like the Flask views. They
+# do not take an admission slot: concurrency on this path is bounded by the
+# async engine's pool (pool_size + max_overflow, waiting pool_timeout).
+#
+import asyncio
+import math
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+from sqlalchemy import func, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import selectinload
+from werkzeug.http import parse_accept_header
+from .compression import choose_encoding, compress_body
+from .json_provider import dumps_bytes
+from .models import Book, Member, Category, Publisher, LibraryLog
+from .replica import REPLICA_BIND_KEY, STICKY_COOKIE
+
+# Sync driver -> async driver used for the same database
+ASYNC_DRIVERS = {
+    'mysql+pymysql': 'mysql+aiomysql',
+    'mysql': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite'
+}
+
+# Pool settings that mean the same thing for the async engine
+ASYNC_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_recycle', 'pool_pre_ping')
+
+DB_ERROR = {'error': 'Database connection issue, please try again'}
+
+
+def to_async_url(uri):
+    """Swap the sync DBAPI in a database URI for its async counterpart"""
+    url = make_url(uri)
+    drivername = ASYNC_DRIVERS.get(url.drivername, url.drivername)
+    query = {key: value for key, value in url.query.items() if key != 'autocommit'}
+    return url.set(drivername=drivername, query=query)
+
+
+def create_async_engine_for(uri, engine_options):
+    """Build an async engine reusing the pool settings of the sync config"""
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    url = to_async_url(uri)
+    options = {}
+    if not url.drivername.startswith('sqlite'):
+        options = {key: engine_options[key] for key in ASYNC_POOL_OPTIONS if key in engine_options}
+    return create_async_engine(url, **options)
+
+
+def _arg(params, name, default='', type=str):
+    """First value of a query-string parameter, converted like request.args.get"""
+    values = params.get(name)
+    if not values:
+        return default
+    try:
+        return type(values[0])
+    except (TypeError, ValueError):
+        return default
+
+
+def _accepts_compact(scope):
+    """Whether the Accept header asks for one of the compact list encodings"""
+    for name, value in scope.get('headers', []):
+        if name == b'accept' and (b'compact' in value or b'msgpack' in value):
+            return True
+    return False
+
+
+async def _paginate(session, query, page, per_page):
+    """Offset pagination with the same shape as Flask-SQLAlchemy's paginate()"""
+    page = max(page, 1)
+    per_page = max(per_page, 1)
+    total = (await session.execute(select(func.count()).select_from(query.order_by(None).subquery()))).scalar()
+    items = (await session.execute(query.limit(per_page).offset((page - 1) * per_page))).scalars().all()
+    pages = math.ceil(total / per_page) if total else 0
+    return items, total, pages
+
+
+async def dashboard(session, params):
+    total_books = (await session.execute(select(func.count(Book.id)))).scalar()
+    total_authors = (await session.execute(select(func.count(func.distinct(Book.author))))).scalar()
+    total_categories = (await session.execute(select(func.count(Category.id)))).scalar()
+    books_available = (await session.execute(select(func.count(Book.id)).where(Book.status == 'Available'))).scalar()
+    books_issued = (await session.execute(select(func.count(Book.id)).where(Book.status == 'Issued'))).scalar()
+    return {
+        'total_books': total_books,
+        'total_authors': total_authors,
+        'total_categories': total_categories,
+        'books_available': books_available,
+        'books_issued': books_issued
+    }
+
+
+async def books(session, params):
+    page = _arg(params, 'page', 1, int)
+    per_page = _arg(params, 'per_page', 100, int)
+
+    query = select(Book).options(selectinload(Book.category), selectinload(Book.publisher))
+    if _arg(params, 'bookName'):
+        query = query.where(Book.book_name.ilike(f"%{_arg(params, 'bookName')}%"))
+    if _arg(params, 'author'):
+        query = query.where(Book.author.ilike(f"%{_arg(params, 'author')}%"))
+    if _arg(params, 'category'):
+        query = query.join(Category).where(Category.name.ilike(f"%{_arg(params, 'category')}%"))
+    if _arg(params, 'publisher'):
+        query = query.join(Publisher).where(Publisher.name.ilike(f"%{_arg(params, 'publisher')}%"))
+    if _arg(params, 'status'):
+        query = query.where(Book.status == _arg(params, 'status'))
+    query = query.order_by(Book.id)
+
+    items, total, pages = await _paginate(session, query, page, per_page)
+    return {
+        'books': [book.to_dict() for book in items],
+        'total': total,
+        'pages': pages,
+        'current_page': page,
+        'per_page': per_page
+    }
+
+
+async def members(session, params):
+    return [member.to_dict() for member in (await session.execute(select(Member))).scalars()]
+
+
+async def categories(session, params):
+    return [category.to_dict() for category in (await session.execute(select(Category))).scalars()]
+
+
+async def publishers(session, params):
+    return [publisher.to_dict() for publisher in (await session.execute(select(Publisher))).scalars()]
+
+
+async def library_log(session, params):
+    page = _arg(params, 'page', 1, int)
+    per_page = _arg(params, 'per_page', 100, int)
+    items, total, pages = await _paginate(session, select(LibraryLog).order_by(LibraryLog.timestamp.desc()), page, per_page)
+    return {
+        'logs': [log.to_dict() for log in items],
+        'total': total,
+        'pages': pages,
+        'current_page': page,
+        'per_page': per_page
+    }
+
+
+ASYNC_READ_ROUTES = {
+    '/api/dashboard': dashboard,
+    '/api/books': books,
+    '/api/members': members,
+    '/api/categories': categories,
+    '/api/publishers': publishers,
+    '/api/library-log': library_log
+}
+
+# Query parameters only the Flask views implement; requests using them are handed over
+FLASK_ONLY_PARAMS = ('fields', 'format')
+FLASK_ONLY_ROUTE_PARAMS = {
+    '/api/library-log': ('archive', 'log_type', 'date', 'from', 'to', 'q')
+}
+
+
+class AsyncReadApp:
+    """ASGI app serving ASYNC_READ_ROUTES on an async engine and delegating the rest to Flask"""
+
+    def __init__(self, flask_app):
+        from asgiref.wsgi import WsgiToAsgi
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        config = flask_app.config
+        engine_options = config.get('SQLALCHEMY_ENGINE_OPTIONS', {})
+        self.flask = WsgiToAsgi(flask_app)
+        self.config = config
+        self.sticky_seconds = config.get('REPLICA_STICKY_SECONDS', 5)
+        self.budgets = config.get('STATEMENT_TIMEOUTS', {})
+        self.default_budget = config.get('STATEMENT_TIMEOUT_DEFAULT')
+        self.compress = (config.get('COMPRESS_ENABLED', True)
+                         and 'application/json' in config.get('COMPRESS_MIMETYPES', ('application/json',)))
+        self.compress_min_size = config.get('COMPRESS_MIN_SIZE', 1024)
+
+        primary_uri = config.get('ASYNC_DATABASE_URI') or config['SQLALCHEMY_DATABASE_URI']
+        self.engines = {None: create_async_engine_for(primary_uri, engine_options)}
+        replica_uri = (config.get('SQLALCHEMY_BINDS') or {}).get(REPLICA_BIND_KEY)
+        if replica_uri:
+            self.engines[REPLICA_BIND_KEY] = create_async_engine_for(replica_uri, engine_options)
+        self.sessions = {
+            key: async_sessionmaker(engine, expire_on_commit=False)
+            for key, engine in self.engines.items()
+        }
+
+    def _session_factory(self, scope):
+        """Replica when configured, primary inside the client's read-your-writes window"""
+        if REPLICA_BIND_KEY not in self.sessions:
+            return self.sessions[None]
+        cookies = SimpleCookie()
+        for name, value in scope.get('headers', []):
+            if name == b'cookie':
+                cookies.load(value.decode('latin-1'))
+        try:
+            if STICKY_COOKIE in cookies and float(cookies[STICKY_COOKIE].value) > time.time():
+                return self.sessions[None]
+        except ValueError:
+            pass
+        return self.sessions[REPLICA_BIND_KEY]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+
+        path = scope.get('path', '').rstrip('/')
+        handler = ASYNC_READ_ROUTES.get(path)
+        if scope['type'] != 'http' or scope.get('method') != 'GET' or handler is None:
+            return await self.flask(scope, receive, send)
+
+        params = parse_qs(scope.get('query_string', b'').decode('utf-8'))
+        flask_only = FLASK_ONLY_PARAMS + FLASK_ONLY_ROUTE_PARAMS.get(path, ())
+        if any(name in params for name in flask_only) or _accepts_compact(scope):
+            # Sparse fieldsets, compact encodings, log filters and archives are built by the Flask views
+            return await self.flask(scope, receive, send)
+        budget = self.budgets.get(f'GET {path}', self.default_budget)
+        try:
+            async with self._session_factory(scope)() as session:
+                payload, status = await asyncio.wait_for(handler(session, params), budget or None), 200
+        except asyncio.TimeoutError:
+            payload, status = {
+                'error': f'This request exceeded its {budget:g}s database time limit. '
+                         'Try narrower filters or a smaller page.'
+            }, 503
+        except Exception as e:
+            print(f"Async read API error on {scope.get('path')}: {e}")
+            payload, status = DB_ERROR, 503
+
+        body = dumps_bytes(payload)
+        headers = [(b'content-type', b'application/json')]
+        if self.compress:
+            headers.append((b'vary', b'Accept-Encoding'))
+            body, encoding = self._compressed(scope, body)
+            if encoding:
+                headers.append((b'content-encoding', encoding.encode('ascii')))
+        headers.append((b'content-length', str(len(body)).encode('ascii')))
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _compressed(self, scope, body):
+        """(body, encoding) compressed like the Flask compression hook, or (body, None)"""
+        if len(body) < self.compress_min_size:
+            return body, None
+        accept = ', '.join(value.decode('latin-1') for name, value in scope.get('headers', [])
+                           if name == b'accept-encoding')
+        encoding = choose_encoding(parse_accept_header(accept))
+        if encoding is None:
+            return body, None
+        compressed = compress_body(body, encoding, self.config)
+        if len(compressed) >= len(body):
+            return body, None
+        return compressed, encoding
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in self.engines.values():
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def create_asgi_app(flask_app):
+    """Wrap the Flask app for an ASGI server, with async handlers for the hot read endpoints"""
+    try:
+        return AsyncReadApp(flask_app)
+    except ImportError as e:
+        raise RuntimeError(
+            f'Async serving mode needs the packages in requirements-async.txt ({e})'
+        ) from e
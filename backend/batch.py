@@ -0,0 +1,86 @@
+#
+# Batch reads: several GET endpoints in one round trip
+#
+#   GET /api/batch?path=/api/dashboard&path=/api/members&path=/api/books%3Fpage%3D1
+#
+# Only the cheap JSON reads in BATCH_ALLOWED_PATHS can be batched; exports
+# and warm-up would otherwise slip past their own admission limits.
+# Each path runs through its normal view, in order, inside the batch
+# request's app context: they share its database session (so one pooled
+# connection and one health check) and its time budget and admission slot.
+# Like the warm-up priming, sub-requests skip the per-request hooks; the
+# batch response as a whole is compressed on the way out.
+#
+import time
+from urllib.parse import urlsplit
+
+from flask import g, request
+from werkzeug.exceptions import HTTPException
+
+BATCH_PATH = '/api/batch'
+
+# Request headers the sub-requests see (auth, content negotiation, replica stickiness)
+FORWARDED_HEADERS = ('x-access-token', 'accept', 'accept-language', 'cookie')
+
+
+class BatchError(ValueError):
+    """The batch itself is malformed (no paths, too many, or a path not allowed in a batch)"""
+
+
+def batch_paths(args, max_requests, allowed_paths):
+    """The sub-request paths from ?path=, validated against ``allowed_paths`` before any of them runs"""
+    paths = [path.strip() for path in args.getlist('path') if path.strip()]
+    if not paths:
+        raise BatchError('Give at least one ?path=/api/... to run')
+    if len(paths) > max_requests:
+        raise BatchError(f'A batch can run at most {max_requests} requests')
+    for path in paths:
+        route = urlsplit(path).path.rstrip('/')
+        if route not in allowed_paths or route == BATCH_PATH:
+            raise BatchError(f'Not a batchable API path: {path}')
+    return paths
+
+
+def run_sub_request(app, path, headers):
+    """Run one GET path through its view in the current app context; returns (status, response or error)"""
+    # The sub-request's g changes (replica choice, popped admission slot) must not leak into the batch
+    saved = dict(vars(g))
+    vars(g).pop('admission_slot', None)
+    try:
+        with app.test_request_context(path, method='GET', headers=headers):
+            try:
+                response = app.make_response(app.dispatch_request())
+            except HTTPException as e:
+                return e.code, {'error': e.description}
+            except Exception as e:
+                print(f"Batch sub-request {path} failed: {e}")
+                return 500, {'error': 'Request failed'}
+        return response.status_code, response
+    finally:
+        vars(g).clear()
+        vars(g).update(saved)
+
+
+def run_batch(app, paths):
+    """Run ``paths`` in order; returns the /api/batch response body"""
+    headers = [(name, value) for name, value in request.headers if name.lower() in FORWARDED_HEADERS]
+    started = time.perf_counter()
+    responses = []
+    for path in paths:
+        status, result = run_sub_request(app, path, headers)
+        if isinstance(result, dict):
+            responses.append({'path': path, 'status': status, 'body': result})
+            continue
+        if not result.is_json:
+            responses.append({'path': path, 'status': 406, 'body': {'error': 'Only JSON responses can be batched'}})
+            continue
+        responses.append({
+            'path': path,
+            'status': status,
+            'content_type': result.mimetype,
+            'body': result.get_json()
+        })
+    return {
+        'responses': responses,
+        'total_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
@@ -0,0 +1,129 @@
+#
+# One-time, lock-protected database initialization
+#
+# Workers only read a small marker file at import. The expensive work
+# (ensure_database_exists, create_all, admin user, sample data) runs once per
+# database under an exclusive file lock, then records SCHEMA_VERSION in the
+# marker. Run it explicitly with:  flask --app app init-db
+#
+import hashlib
+import os
+from contextlib import contextmanager
+from sqlalchemy import inspect, literal, text
+from sqlalchemy.engine import make_url
+
+# Bump when initialize_database() must run again on existing deployments
+SCHEMA_VERSION = 8
+
+
+def _marker_path(app):
+    """Marker file for the configured database (one per database URI)"""
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+    digest = hashlib.sha1(uri.encode('utf-8')).hexdigest()[:12]
+    directory = app.config.get('SCHEMA_MARKER_DIR') or app.instance_path
+    return os.path.join(directory, f'schema_{digest}.version')
+
+
+def initialized_version(app):
+    """Schema version recorded by the last successful bootstrap (0 if none)"""
+    try:
+        with open(_marker_path(app), 'r', encoding='utf-8') as marker:
+            return int(marker.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def _in_memory(app):
+    """An in-memory SQLite database starts empty in every process, whatever a marker says"""
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+    try:
+        url = make_url(uri)
+    except Exception:
+        return False
+    return url.get_backend_name() == 'sqlite' and (
+        url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory'
+    )
+
+
+def needs_bootstrap(app):
+    return _in_memory(app) or initialized_version(app) < SCHEMA_VERSION
+
+
+@contextmanager
+def exclusive_lock(path):
+    """Block until this process holds an exclusive lock on ``path``"""
+    with open(path, 'a+b') as lock_file:
+        try:
+            import fcntl
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        except ImportError:
+            # Windows development machines
+            import msvcrt
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def bootstrap_database(app, initialize, force=False):
+    """Run ``initialize()`` once per database and schema version.
+
+    Concurrent workers wait on the lock; whoever gets it second sees the
+    fresh marker and returns without touching the database.
+    """
+    if not force and not needs_bootstrap(app):
+        return False
+
+    marker = _marker_path(app)
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    with exclusive_lock(marker + '.lock'):
+        if not force and not needs_bootstrap(app):
+            return False
+        if not initialize():
+            return False
+        if _in_memory(app):
+            return True
+        with open(marker + '.tmp', 'w', encoding='utf-8') as tmp:
+            tmp.write(str(SCHEMA_VERSION))
+        os.replace(marker + '.tmp', marker)
+    return True
+
+
+def _column_ddl(column, dialect):
+    """Type for ADD COLUMN, plus the model's scalar default (and NOT NULL) so existing rows get a value"""
+    ddl = column.type.compile(dialect=dialect)
+    default = column.default
+    if default is not None and default.is_scalar:
+        value = literal(default.arg, column.type).compile(dialect=dialect, compile_kwargs={'literal_binds': True})
+        ddl += f'{"" if column.nullable else " NOT NULL"} DEFAULT {value}'
+    return ddl
+
+
+def ensure_table_schema(engine, table):
+    """Add columns and indexes a model gained after its table was created; returns the index names it found.
+
+    create_all() only creates missing tables, so existing deployments need this for new columns.
+    """
+    inspector = inspect(engine)
+    columns = {column['name'] for column in inspector.get_columns(table.name)}
+    for column in table.columns:
+        if column.name not in columns:
+            with engine.begin() as connection:
+                connection.execute(text(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {_column_ddl(column, engine.dialect)}'
+                ))
+            print(f"Added column {table.name}.{column.name}")
+
+    existing = {index['name'] for index in inspector.get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(engine)
+            print(f"Created index {index.name}")
+    return existing
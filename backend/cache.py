@@ -0,0 +1,246 @@
+#
+# Host-wide response cache shared by every worker process
+#
+# Entries live in a local SQLite file (WAL mode), so all Passenger/gunicorn
+# workers on the host see the same cache. Keys embed the data-version
+# counters of the tables a response depends on; any commit that touches one
+# of those tables bumps its counter, which makes older entries unreachable.
+# Replica reads are not stored for REPLICA_STICKY_SECONDS after a bump: the
+# replica may not have the write yet, and the entry would outlive the lag.
+#
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from functools import wraps
+from flask import g, request, current_app, Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from .replica import REPLICA_BIND_KEY, wrote_recently
+from .wire_format import format_key
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    mimetype TEXT NOT NULL,
+    vary TEXT,
+    expires_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_entries_last_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS data_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    bumped_at REAL NOT NULL DEFAULT 0
+);
+"""
+
+# Refresh an entry's LRU timestamp at most this often, to keep hits read-mostly
+_TOUCH_INTERVAL = 5.0
+
+
+class SharedCache:
+    """LRU + TTL cache in a SQLite file, invalidated by per-table data versions"""
+
+    def __init__(self, app=None):
+        self.path = None
+        self.enabled = False
+        self.max_entries = 1000
+        self.default_ttl = 300
+        self.replica_lag = 0
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CACHE_ENABLED', True)
+        self.path = app.config.get('CACHE_PATH') or self._default_path(app)
+        self.max_entries = app.config.get('CACHE_MAX_ENTRIES', 1000)
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+        if REPLICA_BIND_KEY in (app.config.get('SQLALCHEMY_BINDS') or {}):
+            self.replica_lag = app.config.get('REPLICA_STICKY_SECONDS', 5)
+        if self not in _active_caches:
+            _active_caches.append(self)
+
+    @staticmethod
+    def _default_path(app):
+        """One cache file per database, in the instance folder, so deployments never share entries"""
+        uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+        digest = hashlib.sha1(uri.encode('utf-8')).hexdigest()[:12]
+        try:
+            os.makedirs(app.instance_path, exist_ok=True)
+            directory = app.instance_path
+        except OSError:
+            directory = tempfile.gettempdir()
+        return os.path.join(directory, f'response_cache_{digest}.sqlite')
+
+    def _connection(self):
+        """One SQLite connection per thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.executescript(_SCHEMA)
+            if 'vary' not in {row[1] for row in conn.execute('PRAGMA table_info(entries)')}:
+                # Cache files written before entries kept their Vary header
+                conn.execute('ALTER TABLE entries ADD COLUMN vary TEXT')
+            if 'bumped_at' not in {row[1] for row in conn.execute('PRAGMA table_info(data_versions)')}:
+                conn.execute('ALTER TABLE data_versions ADD COLUMN bumped_at REAL NOT NULL DEFAULT 0')
+            self._local.conn = conn
+        return conn
+
+    def _run(self, operation, default=None):
+        """Run a cache operation; cache trouble must never fail a request"""
+        if not self.enabled:
+            return default
+        try:
+            return operation(self._connection())
+        except sqlite3.Error as e:
+            print(f"Shared cache error: {e}")
+            return default
+
+    def versions(self, tables):
+        """Current data version of each table (0 if never bumped)"""
+        def read(conn):
+            found = dict(conn.execute(
+                f"SELECT name, version FROM data_versions WHERE name IN ({','.join('?' * len(tables))})",
+                tables
+            ).fetchall())
+            return tuple(found.get(table, 0) for table in tables)
+        return self._run(read, tuple(0 for _ in tables))
+
+    def last_bump(self, tables):
+        """time.time() of the latest bump of any table in ``tables`` (0 if never bumped)"""
+        def read(conn):
+            return conn.execute(
+                f"SELECT MAX(bumped_at) FROM data_versions WHERE name IN ({','.join('?' * len(tables))})",
+                tables
+            ).fetchone()[0] or 0
+        return self._run(read, 0)
+
+    def bump(self, tables):
+        """Advance the data version of every table in ``tables``"""
+        def write(conn):
+            now = time.time()
+            conn.executemany(
+                "INSERT INTO data_versions (name, version, bumped_at) VALUES (?, 1, ?) "
+                "ON CONFLICT(name) DO UPDATE SET version = version + 1, bumped_at = excluded.bumped_at",
+                [(table, now) for table in tables]
+            )
+        self._run(write)
+
+    def _replica_may_lag(self, tables):
+        """Whether this request read a replica that may not have the tables' latest write yet"""
+        if not self.replica_lag or not g.get('use_replica'):
+            return False
+        return time.time() - self.last_bump(tables) < self.replica_lag
+
+    def get(self, key):
+        """Return (value, mimetype, vary) or None"""
+        def read(conn):
+            now = time.time()
+            row = conn.execute(
+                "SELECT value, mimetype, vary, last_access FROM entries WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[3] > _TOUCH_INTERVAL:
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            return row[0], row[1], row[2]
+        return self._run(read)
+
+    def set(self, key, value, mimetype, ttl=None, vary=None):
+        def write(conn):
+            now = time.time()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, mimetype, vary, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, mimetype, vary, now + (ttl or self.default_ttl), now)
+            )
+            self._evict(conn, now)
+        self._run(write)
+
+    def _evict(self, conn, now):
+        """Drop expired entries, then the least recently used ones beyond max_entries"""
+        count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_access LIMIT "
+            "max(0, (SELECT COUNT(*) FROM entries) - ?))",
+            (self.max_entries,)
+        )
+
+    def clear(self):
+        self._run(lambda conn: conn.execute("DELETE FROM entries"))
+
+    def cached(self, *tables, ttl=None):
+        """Cache a GET handler's 200 JSON response until one of ``tables`` changes or ``ttl`` expires"""
+        def decorator(f):
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                if not self.enabled:
+                    return f(*args, **kwargs)
+
+                query = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+                versions = '.'.join(str(v) for v in self.versions(tables))
+                # Clients in their read-your-writes window read the primary: keep their entries apart
+                source = 'primary' if wrote_recently() else 'any'
+                # Plain and compact encodings of the same list are different entries
+                key = f'{request.path}?{query}|{versions}|{source}|{format_key(request)}'
+
+                hit = self.get(key)
+                if hit is not None:
+                    response = Response(hit[0], mimetype=hit[1])
+                    if hit[2]:
+                        response.headers['Vary'] = hit[2]
+                    return response
+
+                response = current_app.make_response(f(*args, **kwargs))
+                if (response.status_code == 200 and response.is_json and not response.direct_passthrough
+                        and not self._replica_may_lag(tables)):
+                    self.set(key, response.get_data(), response.mimetype, ttl, response.headers.get('Vary'))
+                return response
+            return decorated
+        return decorator
+
+
+# Caches whose data versions follow this process's commits
+_active_caches = []
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_flushed_tables(session, flush_context):
+    changed = session.info.setdefault('changed_tables', set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        table = getattr(type(obj), '__tablename__', None)
+        if table:
+            changed.add(table)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_tables(execute_state):
+    if (execute_state.is_update or execute_state.is_delete) and execute_state.bind_mapper is not None:
+        execute_state.session.info.setdefault('changed_tables', set()).add(
+            execute_state.bind_mapper.local_table.name
+        )
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed_tables(session):
+    """Bump data versions for every table the committed transaction wrote to"""
+    changed = session.info.pop('changed_tables', None)
+    if changed:
+        for cache in _active_caches:
+            cache.bump(sorted(changed))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back_tables(session):
+    session.info.pop('changed_tables', None)
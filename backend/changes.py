@@ -0,0 +1,147 @@
+#
+# Delta sync: what changed since a client's last change token
+#
+# GET /api/changes?since=<token> returns the books, members, categories,
+# publishers and issue records inserted or updated (by updated_at) and
+# deleted (by tombstone) since the token, plus a new token to pass next
+# time. Tokens are UTC milliseconds, cut before the reads. Each call also
+# re-reads the CHANGES_OVERLAP_SECONDS before ``since``, so rows written by
+# a transaction that committed after the previous token are not missed;
+# clients apply the rows as upserts, so repeats are harmless.
+#
+# Tombstones are kept for CHANGES_RETENTION_DAYS (`flask prune-tombstones`
+# from cron); an older token gets 410 and the client reloads its lists.
+#
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import selectinload
+from .bootstrap import ensure_table_schema
+from .extensions import db
+from .models import Book, Member, Category, Publisher, IssueHistory, Tombstone
+
+# Response key -> (model, tombstone entity type, to_dict() id key, relationships to_dict() reads)
+SYNCED_MODELS = {
+    'books': (Book, 'book', 'library_id', ('category', 'publisher')),
+    'members': (Member, 'member', 'id', ()),
+    'categories': (Category, 'category', 'id', ()),
+    'publishers': (Publisher, 'publisher', 'id', ()),
+    'issue_history': (IssueHistory, 'issue', 'id', ('book', 'member')),
+}
+
+
+class ChangeTokenError(ValueError):
+    """The since token is malformed (400) or older than the tombstones kept (410)"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def current_token():
+    return int(time.time() * 1000)
+
+
+def _token_time(token):
+    """Naive UTC datetime, comparable with the utcnow() timestamps in the models"""
+    return datetime.utcfromtimestamp(token / 1000)
+
+
+def parse_since(args, retention_days):
+    """The ?since= token as an int, or None for a first sync that only wants a token"""
+    raw = args.get('since', '').strip()
+    if not raw:
+        return None
+    try:
+        since = int(raw)
+    except ValueError:
+        raise ChangeTokenError('since must be a change token returned by /api/changes')
+    if since < 0 or since > current_token():
+        raise ChangeTokenError('since must be a change token returned by /api/changes')
+    if _token_time(since) < datetime.utcnow() - timedelta(days=retention_days):
+        raise ChangeTokenError('This change token has expired; reload all data', 410)
+    return since
+
+
+def record_deletions(entity_type, ids):
+    """Tombstones for rows removed or hidden by bulk statements, which skip the ORM delete event"""
+    if ids:
+        now = datetime.utcnow()
+        db.session.execute(
+            Tombstone.__table__.insert(),
+            [{'entity_type': entity_type, 'entity_id': entity_id, 'deleted_at': now} for entity_id in ids]
+        )
+
+
+def changes_since(since, overlap_seconds, max_rows):
+    """Inserted, updated and deleted rows per synced list since ``since``; None if more than ``max_rows`` changed"""
+    token = current_token()
+    changes = {'token': token, 'since': since, 'changes': {}}
+    if since is None:
+        return changes
+
+    window_start = _token_time(since) - timedelta(seconds=overlap_seconds)
+    deleted = {}
+    for entity_type, entity_id in db.session.execute(
+        select(Tombstone.entity_type, Tombstone.entity_id)
+        .where(Tombstone.deleted_at >= window_start)
+        .order_by(Tombstone.id)
+    ):
+        deleted.setdefault(entity_type, []).append(entity_id)
+
+    for key, (model, entity_type, id_key, relationships) in SYNCED_MODELS.items():
+        rows = (
+            model.query
+            .options(*[selectinload(getattr(model, name)) for name in relationships])
+            .filter(model.updated_at >= window_start)
+            .order_by(model.updated_at, model.id)
+            .limit(max_rows + 1)
+            .all()
+        )
+        if len(rows) > max_rows:
+            return None
+
+        inserted, updated = [], []
+        for row in rows:
+            (inserted if row.created_at and row.created_at >= window_start else updated).append(row.to_dict())
+        # An id that is live again (re-created after its tombstone) is not deleted
+        live_ids = {item[id_key] for item in inserted + updated}
+        changes['changes'][key] = {
+            'inserted': inserted,
+            'updated': updated,
+            'deleted': list(dict.fromkeys(
+                entity_id for entity_id in deleted.get(entity_type, ()) if entity_id not in live_ids
+            ))
+        }
+    return changes
+
+
+def prune_tombstones(retention_days):
+    """Delete tombstones older than the retention window. Returns the number removed."""
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    result = db.session.execute(delete(Tombstone).where(Tombstone.deleted_at < cutoff))
+    db.session.commit()
+    return result.rowcount
+
+
+def ensure_change_schema(engine):
+    """Add updated_at to tables created before delta sync, starting it at created_at"""
+    for model, _, _, _ in SYNCED_MODELS.values():
+        ensure_table_schema(engine, model.__table__)
+        with engine.begin() as connection:
+            connection.execute(
+                update(model.__table__)
+                .where(model.__table__.c.updated_at.is_(None))
+                .values(updated_at=model.__table__.c.created_at)
+            )
+
+
+def register_change_commands(app):
+    """Add `flask prune-tombstones`"""
+
+    @app.cli.command('prune-tombstones')
+    def prune_tombstones_command():
+        """Delete delete-markers older than CHANGES_RETENTION_DAYS"""
+        retention_days = app.config.get('CHANGES_RETENTION_DAYS', 30)
+        removed = prune_tombstones(retention_days)
+        print(f"Removed {removed} tombstones older than {retention_days} days")
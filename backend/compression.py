@@ -0,0 +1,90 @@
+#
+# Response compression (gzip, brotli when installed)
+#
+# JSON and CSV responses above COMPRESS_MIN_SIZE are encoded with the best
+# coding the client accepts. Streamed responses are compressed chunk by
+# chunk, so a streamed export still starts downloading right away.
+#
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+
+def _encoder(encoding, config):
+    """(compress(chunk), finish()) pair for one response body"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=config.get('COMPRESS_BROTLI_QUALITY', 4))
+        return compressor.process, compressor.finish
+    # wbits=31: zlib stream with a gzip header and trailer
+    compressor = zlib.compressobj(config.get('COMPRESS_GZIP_LEVEL', 6), zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+
+def compress_body(data, encoding, config):
+    """Compress a complete body with ``encoding`` ('gzip' or 'br')"""
+    compress, finish = _encoder(encoding, config)
+    return compress(data) + finish()
+
+
+def _compress_stream(chunks, encoding, config):
+    compress, finish = _encoder(encoding, config)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            compressed = compress(chunk)
+            if compressed:
+                yield compressed
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def choose_encoding(accept_encodings):
+    """Best supported coding the client accepts, or None"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def register_compression(app):
+    """Compress JSON/CSV responses for clients that send Accept-Encoding"""
+    if not app.config.get('COMPRESS_ENABLED', True):
+        return
+
+    mimetypes = set(app.config.get('COMPRESS_MIMETYPES', ('application/json', 'text/csv')))
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+
+    @app.after_request
+    def compress_response(response):
+        if (request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or response.mimetype not in mimetypes or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return response
+
+        encoding = choose_encoding(request.accept_encodings)
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding, app.config)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < min_size:
+                return response
+            compressed = compress_body(data, encoding, app.config)
+            if len(compressed) >= len(data):
+                return response
+            response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        return response
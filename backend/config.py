@@ -2,17 +2,129 @@
 # PASTE THIS ENTIRE CODE INTO: backend/config.py
 #
 import os
+from .pool import AdaptiveQueuePool
 
 class Config:
     """Base configuration class"""
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'a-very-secure-default-key'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Database bootstrap: `flask --app app init-db` writes a schema marker here
+    # (defaults to the Flask instance folder); with AUTO_BOOTSTRAP_DATABASE the
+    # first worker to import the app does it instead, once, under a file lock
+    SCHEMA_MARKER_DIR = os.environ.get('SCHEMA_MARKER_DIR')
+    AUTO_BOOTSTRAP_DATABASE = os.environ.get('AUTO_BOOTSTRAP_DATABASE', 'true').lower() != 'false'
+
     # Pagination defaults
     BOOKS_PER_PAGE = 100
     LOGS_PER_PAGE = 100
     HISTORY_PER_PAGE = 100
 
+    # Bulk delete: rows per UPDATE/DELETE statement and pause between purge chunks
+    PURGE_CHUNK_SIZE = 500
+    PURGE_PAUSE_SECONDS = 0.05
+    # Books linked to a bulk-delete or CSV-import log entry (their activity timelines); the rest are only counted
+    BULK_LOG_LINKS = 100
+
+    # Library log retention: `flask archive-logs` moves older entries to monthly
+    # JSONL.gz segments in LOG_ARCHIVE_DIR (default: instance/log_archive)
+    LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS', 90))
+    LOG_ARCHIVE_DIR = os.environ.get('LOG_ARCHIVE_DIR')
+    LOG_ARCHIVE_CHUNK_SIZE = 500
+    LOG_FULLTEXT_SEARCH = os.environ.get('LOG_FULLTEXT_SEARCH', 'true').lower() != 'false'  # MySQL only
+
+    # Delta sync (/api/changes): rows re-sent from before each token, how long
+    # delete tombstones are kept (`flask prune-tombstones`), and the most rows
+    # per list before the client is told to reload instead
+    CHANGES_OVERLAP_SECONDS = 30
+    CHANGES_RETENTION_DAYS = int(os.environ.get('CHANGES_RETENTION_DAYS', 30))
+    CHANGES_MAX_ROWS = 5000
+
+    # Read replica: clients read from the primary for this long after their own writes
+    REPLICA_STICKY_SECONDS = 5
+
+    # Adaptive pool: pool_size/max_overflow are the floor, the pool grows while
+    # checkouts wait longer than POOL_TARGET_WAIT_MS, never past POOL_MAX_CONNECTIONS
+    POOL_MAX_CONNECTIONS = int(os.environ.get('DB_POOL_MAX_CONNECTIONS', 4))
+    POOL_TARGET_WAIT_MS = 100
+    POOL_SHRINK_AFTER_SECONDS = 60
+
+    # Host-wide response cache (SQLite file shared by all worker processes)
+    CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'true').lower() != 'false'
+    CACHE_PATH = os.environ.get('CACHE_PATH')  # defaults to one file per database in instance/
+    CACHE_MAX_ENTRIES = 1000
+    CACHE_DEFAULT_TTL = 300
+
+    # GET routes /api/warm-up runs (lookups first, then the pages the frontend
+    # opens with, using the exact query strings it sends so cache keys match)
+    WARM_UP_ROUTES = (
+        '/api/categories',
+        '/api/publishers',
+        '/api/members',
+        '/api/dashboard',
+        '/api/books?page=1&per_page=100&format=compact',
+        '/api/issue-history?format=compact',
+        '/api/library-log'
+    )
+
+    # Response compression for JSON/CSV (brotli if the module is installed, else gzip)
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'true').lower() != 'false'
+    COMPRESS_MIMETYPES = ('application/json', 'text/csv', 'application/vnd.lms.compact+json',
+                          'application/vnd.lms.compact+msgpack')
+    COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies gain little and cost a header
+    COMPRESS_GZIP_LEVEL = 6
+    COMPRESS_BROTLI_QUALITY = 4
+
+    # Static assets: serve the fingerprinted build from STATIC_BUILD_DIR when it exists
+    STATIC_BUILD_DIR = 'dist'
+    STATIC_USE_BUILD = os.environ.get('STATIC_USE_BUILD', 'true').lower() != 'false'
+
+    # Identical concurrent expensive reads share one execution; followers give up after this
+    COALESCE_WAIT_SECONDS = 30
+
+    # Admission control in front of the pool: excess requests queue briefly by
+    # priority, then get 503 + Retry-After instead of stalling on pool_timeout
+    ADMISSION_ENABLED = os.environ.get('ADMISSION_ENABLED', 'true').lower() != 'false'
+    ADMISSION_MAX_CONCURRENT = POOL_MAX_CONNECTIONS
+    ADMISSION_QUEUE_SIZE = 20
+    ADMISSION_QUEUE_TIMEOUTS = {'circulation': 10.0, 'write': 5.0, 'read': 2.0, 'low': 0.5}
+    ADMISSION_LOW_PRIORITY_SLOTS = 1
+    ADMISSION_RETRY_AFTER_SECONDS = 2
+    ADMISSION_CIRCULATION_ROUTES = (
+        'POST /api/books/<int:book_id>/issue',
+        'POST /api/books/<int:book_id>/return'
+    )
+    ADMISSION_LOW_PRIORITY_ROUTES = (
+        'GET /api/books/export-csv',
+        'GET /api/library-log',
+        'GET /api/warm-up'
+    )
+    ADMISSION_ROUTE_LIMITS = {'GET /api/books/export-csv': 1}
+    ADMISSION_EXEMPT_PATHS = ('/api/health',)
+
+    # Most ?path= sub-requests one /api/batch call may run, and the only routes it may run:
+    # cheap JSON reads (exports and warm-up keep their own admission limits and budgets)
+    BATCH_MAX_REQUESTS = 20
+    BATCH_ALLOWED_PATHS = (
+        '/api/health', '/api/dashboard', '/api/changes',
+        '/api/books', '/api/members', '/api/categories', '/api/publishers',
+        '/api/issue-history', '/api/library-log'
+    )
+
+    # GET handlers that hit a dropped connection are re-run once after a random pause in this range (seconds)
+    DISCONNECT_RETRY_BACKOFF = (0.05, 0.25)
+
+    # Database time budget per request, in seconds ("METHOD rule" -> seconds).
+    # GET routes not listed get STATEMENT_TIMEOUT_DEFAULT; other writes are unlimited.
+    STATEMENT_TIMEOUT_DEFAULT = 10
+    STATEMENT_TIMEOUTS = {
+        'GET /api/books': 5,
+        'GET /api/dashboard': 5,
+        'GET /api/books/export-csv': 30,
+        'GET /api/batch': 20,
+        'POST /api/books/import-csv': 120
+    }
+
 class DevelopmentConfig(Config):
     """Development configuration - MySQL for consistency"""
     DEBUG = True
@@ -20,11 +132,15 @@ class DevelopmentConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'mysql+pymysql://root@localhost/library?charset=utf8mb4&collation=utf8mb4_unicode_ci'
     # Connection pool settings to handle connection drops
     SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': AdaptiveQueuePool,
         'pool_pre_ping': True,
         'pool_recycle': 300,
         'pool_timeout': 20,
         'max_overflow': 0
     }
+    # Optional read replica for read-only endpoints (e.g. a second SQLite file for testing)
+    if os.environ.get('DATABASE_REPLICA_URL'):
+        SQLALCHEMY_BINDS = {'replica': os.environ.get('DATABASE_REPLICA_URL')}
 
 class ProductionConfig(Config):
     """Production configuration for cPanel deployment"""
@@ -40,13 +156,21 @@ class ProductionConfig(Config):
     # Construct the database URI - set to None if variables are missing
     # This prevents errors during class definition, error will only occur if this config is actually used
     if all([DB_USER, DB_PASSWORD, DB_HOST, DB_NAME]):
-        SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}?charset=utf8mb4&collation=utf8mb4_unicode_ci&connect_timeout=60&read_timeout=60&write_timeout=60&autocommit=true"
+        SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}?charset=utf8mb4&collation=utf8mb4_unicode_ci&connect_timeout=60&read_timeout=60&write_timeout=60"
     else:
         # Set to None - the application will check this and provide a clear error message
         SQLALCHEMY_DATABASE_URI = None
 
+    # Optional read replica: same credentials and database name on DB_REPLICA_HOST
+    DB_REPLICA_HOST = os.environ.get('DB_REPLICA_HOST')
+    if SQLALCHEMY_DATABASE_URI and DB_REPLICA_HOST:
+        SQLALCHEMY_BINDS = {
+            'replica': f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_REPLICA_HOST}/{DB_NAME}?charset=utf8mb4&collation=utf8mb4_unicode_ci&connect_timeout=60&read_timeout=60&write_timeout=60"
+        }
+
     # Connection pool settings for cPanel stability - optimized for shared hosting
     SQLALCHEMY_ENGINE_OPTIONS = {
+        'poolclass': AdaptiveQueuePool,  # Grows past pool_size up to POOL_MAX_CONNECTIONS under load
         'pool_size': 1,  # Conservative pool size for shared hosting
         'pool_timeout': 30,  # Increased timeout for slower connections
         'pool_recycle': 180,  # Shorter recycle time to prevent timeouts
@@ -56,7 +180,7 @@ class ProductionConfig(Config):
             'connect_timeout': 60,
             'read_timeout': 60,
             'write_timeout': 60,
-            'autocommit': True,
+            # No driver autocommit: each mutating request is one transaction (backend/transaction.py)
             'charset': 'utf8mb4',
             'use_unicode': True,
             'sql_mode': 'TRADITIONAL'
@@ -67,6 +191,7 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    CACHE_ENABLED = False
 
 # Configuration dictionary that the application will use
 config = {
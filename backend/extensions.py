@@ -3,6 +3,9 @@
 #
 from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
+from .transaction import UnitOfWorkSession
+from .cache import SharedCache
 
-db = SQLAlchemy()
-bcrypt = Bcrypt()
\ No newline at end of file
+db = SQLAlchemy(session_options={'class_': UnitOfWorkSession})
+bcrypt = Bcrypt()
+cache = SharedCache()
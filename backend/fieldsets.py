@@ -0,0 +1,126 @@
+#
+# Sparse fieldsets: ?fields=library_id,bookName,author on list endpoints
+#
+# Each list names the to_dict() keys it can return as SQL expressions, so a
+# sparse request selects only those columns (joining categories/publishers
+# only when their names are asked for) and serializes only those keys.
+#
+from sqlalchemy.orm import aliased
+from .models import Book, Member, Category, Publisher, IssueHistory, LibraryLog
+
+_category = aliased(Category)
+_publisher = aliased(Publisher)
+_book = aliased(Book)
+_member = aliased(Member)
+
+
+def _columns(model, *names):
+    return {name: (getattr(model, name), None) for name in names}
+
+
+# key -> (expression, outer join needed for it or None)
+FIELDSETS = {
+    'book': {
+        'library_id': (Book.id, None),
+        'bookName': (Book.book_name, None),
+        'author': (Book.author, None),
+        'category': (_category.name, (_category, Book.category_id == _category.id)),
+        'editor': (Book.editor, None),
+        'volumes': (Book.volumes, None),
+        'publisher': (_publisher.name, (_publisher, Book.publisher_id == _publisher.id)),
+        'year': (Book.year, None),
+        'copies': (Book.copies, None),
+        'available_copies': (Book.available_copies, None),
+        'status': (Book.status, None),
+        'completion_status': (Book.completion_status, None),
+        'note': (Book.note, None),
+        'created_at': (Book.created_at, None),
+        'updated_at': (Book.updated_at, None),
+        'version': (Book.version, None),
+    },
+    'member': _columns(Member, 'id', 'name', 'email', 'phone', 'address', 'created_at', 'updated_at', 'version'),
+    'category': _columns(Category, 'id', 'name', 'description', 'created_at', 'updated_at', 'version'),
+    'publisher': _columns(Publisher, 'id', 'name', 'address', 'contact_info', 'created_at', 'updated_at',
+                          'version'),
+    'issue': {
+        'id': (IssueHistory.id, None),
+        'book_id': (IssueHistory.book_id, None),
+        'bookName': (_book.book_name, (_book, IssueHistory.book_id == _book.id)),
+        'memberName': (_member.name, (_member, IssueHistory.member_id == _member.id)),
+        'issueDate': (IssueHistory.issue_date, None),
+        'returnDate': (IssueHistory.return_date, None),
+        'actualReturnDate': (IssueHistory.actual_return_date, None),
+        'status': (IssueHistory.status, None),
+        'notes': (IssueHistory.notes, None),
+        'created_at': (IssueHistory.created_at, None),
+        'updated_at': (IssueHistory.updated_at, None),
+    },
+    'log': _columns(LibraryLog, 'id', 'timestamp', 'content', 'log_type',
+                    'entity_type', 'entity_id', 'actor_id', 'payload'),
+}
+
+# The model each list selects from, whichever columns are asked for
+MODELS = {
+    'book': Book,
+    'member': Member,
+    'category': Category,
+    'publisher': Publisher,
+    'issue': IssueHistory,
+    'log': LibraryLog,
+}
+
+# Keys whose to_dict() value is formatted, not the raw column
+FORMATTERS = {
+    'log': {'timestamp': lambda value: value.strftime('%Y-%m-%d %H:%M:%S') if value else None},
+}
+
+
+class FieldsetError(ValueError):
+    """?fields= named keys the endpoint does not have"""
+
+
+def requested_fields(args, kind):
+    """Keys asked for with ?fields=, in request order, or None for the full objects"""
+    raw = args.get('fields', '').strip()
+    if not raw:
+        return None
+    keys = list(dict.fromkeys(key.strip() for key in raw.split(',') if key.strip()))
+    unknown = [key for key in keys if key not in FIELDSETS[kind]]
+    if unknown or not keys:
+        raise FieldsetError(
+            f'Unknown fields: {", ".join(unknown) or "(none given)"}. '
+            f'Available: {", ".join(FIELDSETS[kind])}'
+        )
+    return keys
+
+
+def select_fields(query, kind, keys):
+    """Restrict a model query to the columns behind ``keys`` (plus their joins); call before filtering"""
+    spec = FIELDSETS[kind]
+    joins = []
+    for key in keys:
+        join = spec[key][1]
+        if join is not None and join not in joins:
+            joins.append(join)
+    query = query.with_entities(*[spec[key][0].label(key) for key in keys]).select_from(MODELS[kind])
+    for target, onclause in joins:
+        query = query.outerjoin(target, onclause)
+    return query
+
+
+def rows_to_dicts(rows, kind, keys):
+    """Sparse rows as dicts with the same values to_dict() would give"""
+    formatters = FORMATTERS.get(kind, {})
+    active = {key: formatters[key] for key in keys if key in formatters}
+    results = []
+    for row in rows:
+        item = dict(row._mapping)
+        for key, formatter in active.items():
+            item[key] = formatter(item[key])
+        results.append(item)
+    return results
+
+
+def sparse_dicts(entries, keys):
+    """Trim already-built dicts (e.g. archived log entries) to ``keys``"""
+    return [{key: entry.get(key) for key in keys} for entry in entries]
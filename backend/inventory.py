@@ -0,0 +1,59 @@
+#
+# Copy-level availability, changed only through atomic conditional UPDATEs
+#
+from sqlalchemy import case, update
+from .extensions import db
+from .models import Book, IssueHistory
+
+
+def checkout_copy(book_id):
+    """Take one copy off the shelf. Returns False when no copy is available.
+
+    The decrement only happens while available_copies > 0, so two desks
+    issuing the last copy at the same moment cannot both succeed.
+    """
+    # status is assigned first: MySQL evaluates SET left to right
+    result = db.session.execute(
+        update(Book)
+        .where(Book.id == book_id, Book.available_copies > 0, Book.deleted_at.is_(None))
+        .ordered_values(
+            (Book.status, case((Book.available_copies <= 1, 'Issued'), else_=Book.status)),
+            (Book.available_copies, Book.available_copies - 1),
+            (Book.version, Book.version + 1)
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def checkin_copy(book_id):
+    """Put one copy back on the shelf, never above the number of copies owned"""
+    result = db.session.execute(
+        update(Book)
+        .where(Book.id == book_id, Book.available_copies < Book.copies)
+        .values(available_copies=Book.available_copies + 1, status='Available', version=Book.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def close_issue_record(issue_id, actual_return_date):
+    """Mark a pending issue record returned. Returns False if another request already closed it."""
+    result = db.session.execute(
+        update(IssueHistory)
+        .where(IssueHistory.id == issue_id, IssueHistory.status == 'Pending')
+        .values(status='Returned', actual_return_date=actual_return_date)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def adjust_copies(book, copies):
+    """Change the number of copies owned, keeping the shelf count in step"""
+    on_loan = (book.copies or 0) - (book.available_copies or 0)
+    book.copies = copies
+    book.available_copies = max(copies - on_loan, 0)
+    if book.available_copies == 0:
+        book.status = 'Issued'
+    elif book.status == 'Issued':
+        book.status = 'Available'
@@ -0,0 +1,130 @@
+#
+# Library log retention: archive old entries into monthly JSONL.gz segments
+#
+# `flask --app app archive-logs` (run daily from cron) moves entries older
+# than LOG_RETENTION_DAYS out of the library_log table, a chunk at a time,
+# into append-only segments named library_log-YYYY-MM.jsonl.gz. Each chunk
+# is written and fsynced before its rows are deleted, so a crash can at worst
+# leave an entry in both places; readers drop such duplicates by id.
+# Archived entries keep their entity fields but leave the activity timelines.
+#
+import gzip
+import json
+import os
+import re
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy import delete, select
+from .bootstrap import exclusive_lock
+from .extensions import db
+from .models import LibraryLog, LogEntity
+
+SEGMENT_PATTERN = re.compile(r'^library_log-(\d{4}-\d{2})\.jsonl\.gz$')
+
+
+def archive_dir(app):
+    return app.config.get('LOG_ARCHIVE_DIR') or os.path.join(app.instance_path, 'log_archive')
+
+
+def _segment_path(directory, month):
+    return os.path.join(directory, f'library_log-{month}.jsonl.gz')
+
+
+def _append_segment(path, entries):
+    # Each append adds a gzip member; gzip readers treat them as one stream
+    with open(path, 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb') as segment:
+            for entry in entries:
+                segment.write((json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8'))
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def archive_old_logs(app, retention_days=None, chunk_size=None):
+    """Move log entries older than the retention window into monthly segments. Returns the number moved."""
+    if retention_days is None:
+        retention_days = app.config.get('LOG_RETENTION_DAYS', 90)
+    chunk_size = chunk_size or app.config.get('LOG_ARCHIVE_CHUNK_SIZE', 500)
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    directory = archive_dir(app)
+    os.makedirs(directory, exist_ok=True)
+
+    moved = 0
+    with exclusive_lock(os.path.join(directory, '.archive.lock')):
+        while True:
+            logs = db.session.execute(
+                select(LibraryLog)
+                .where(LibraryLog.timestamp < cutoff)
+                .order_by(LibraryLog.timestamp, LibraryLog.id)
+                .limit(chunk_size)
+            ).scalars().all()
+            if not logs:
+                break
+
+            by_month = {}
+            for log in logs:
+                entry = log.to_dict()
+                by_month.setdefault(log.timestamp.strftime('%Y-%m'), []).append(entry)
+            for month, entries in by_month.items():
+                _append_segment(_segment_path(directory, month), entries)
+
+            log_ids = [log.id for log in logs]
+            db.session.execute(
+                delete(LogEntity)
+                .where(LogEntity.log_id.in_(log_ids))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.execute(
+                delete(LibraryLog)
+                .where(LibraryLog.id.in_(log_ids))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            db.session.expunge_all()
+            moved += len(logs)
+    return moved
+
+
+def list_archives(app):
+    """Archived months, newest first, with their segment sizes"""
+    directory = archive_dir(app)
+    if not os.path.isdir(directory):
+        return []
+    archives = []
+    for filename in os.listdir(directory):
+        match = SEGMENT_PATTERN.match(filename)
+        if match:
+            archives.append({
+                'month': match.group(1),
+                'size_bytes': os.path.getsize(os.path.join(directory, filename))
+            })
+    return sorted(archives, key=lambda archive: archive['month'], reverse=True)
+
+
+def read_archive(app, month):
+    """All entries archived for ``month`` (YYYY-MM), newest first; None if there is no segment"""
+    if not re.match(r'^\d{4}-\d{2}$', month or ''):
+        return None
+    path = _segment_path(archive_dir(app), month)
+    if not os.path.exists(path):
+        return None
+
+    entries = {}
+    with gzip.open(path, 'rt', encoding='utf-8') as segment:
+        for line in segment:
+            if line.strip():
+                entry = json.loads(line)
+                entries[entry['id']] = entry
+    return sorted(entries.values(), key=lambda entry: (entry['timestamp'] or '', entry['id']), reverse=True)
+
+
+def register_log_archive_commands(app):
+    """Add `flask archive-logs`"""
+
+    @app.cli.command('archive-logs')
+    @click.option('--retention-days', type=int, default=None, help='Override LOG_RETENTION_DAYS')
+    def archive_logs_command(retention_days):
+        """Move old library log entries into monthly archive segments"""
+        moved = archive_old_logs(app, retention_days=retention_days)
+        print(f"Archived {moved} library log entries into {archive_dir(app)}")
@@ -0,0 +1,112 @@
+#
+# Library log filters: log_type, time range and text search
+#
+# Filters run against the (log_type, timestamp) index; text search uses a
+# MySQL FULLTEXT index on content when one exists and falls back to LIKE
+# elsewhere. ensure_log_schema() adds the indexes during `init-db` (the
+# FULLTEXT one only on MySQL with LOG_FULLTEXT_SEARCH). The same filters
+# apply to archived months.
+#
+import re
+from datetime import datetime, timedelta
+from sqlalchemy import inspect, text
+from .bootstrap import ensure_table_schema
+from .models import LibraryLog
+
+FULLTEXT_INDEX_NAME = 'ix_library_log_content_fulltext'
+
+# MySQL's default innodb_ft_min_token_size; shorter terms can't use the index
+FULLTEXT_MIN_TERM_LENGTH = 3
+
+# Characters with a meaning in MATCH ... IN BOOLEAN MODE
+FULLTEXT_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+_fulltext_available = {}
+
+
+class LogFilterError(ValueError):
+    """A filter parameter could not be parsed"""
+
+
+def _parse_time(value, name, end_of_range=False):
+    """ISO date or datetime; a bare date as the end of a range means the whole day"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise LogFilterError(f'{name} must be YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS')
+    if end_of_range and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def parse_log_filters(args):
+    """Filters from the query string: log_type (comma separated), date, from, to, q"""
+    filters = {}
+    if args.get('log_type'):
+        filters['log_types'] = [t.strip() for t in args['log_type'].split(',') if t.strip()]
+    if args.get('date'):
+        filters['start'] = _parse_time(args['date'], 'date')
+        filters['end'] = _parse_time(args['date'], 'date', end_of_range=True)
+    if args.get('from'):
+        filters['start'] = _parse_time(args['from'], 'from')
+    if args.get('to'):
+        filters['end'] = _parse_time(args['to'], 'to', end_of_range=True)
+    if args.get('q', '').strip():
+        filters['q'] = args['q'].strip()
+    return filters
+
+
+def fulltext_available(session):
+    """Whether the bound database has the FULLTEXT index (checked once per engine)"""
+    engine = session.get_bind(mapper=inspect(LibraryLog))
+    key = str(engine.url)
+    if key not in _fulltext_available:
+        _fulltext_available[key] = engine.dialect.name == 'mysql' and any(
+            index['name'] == FULLTEXT_INDEX_NAME for index in inspect(engine).get_indexes('library_log')
+        )
+    return _fulltext_available[key]
+
+
+def apply_log_filters(query, filters, use_fulltext=False):
+    """Narrow a LibraryLog query; end of range is exclusive"""
+    if filters.get('log_types'):
+        query = query.filter(LibraryLog.log_type.in_(filters['log_types']))
+    if filters.get('start'):
+        query = query.filter(LibraryLog.timestamp >= filters['start'])
+    if filters.get('end'):
+        query = query.filter(LibraryLog.timestamp < filters['end'])
+    if filters.get('q'):
+        words = FULLTEXT_OPERATORS.sub(' ', filters['q']).split()
+        if use_fulltext and words and all(len(word) >= FULLTEXT_MIN_TERM_LENGTH for word in words):
+            boolean_query = ' '.join(f'+{word}*' for word in words)
+            query = query.filter(
+                text('MATCH (library_log.content) AGAINST (:ft IN BOOLEAN MODE)').bindparams(ft=boolean_query)
+            )
+        else:
+            for term in filters['q'].split():
+                query = query.filter(LibraryLog.content.icontains(term, autoescape=True))
+    return query
+
+
+def filter_archived(entries, filters):
+    """The same filters over archived entries (dicts from the JSONL segments)"""
+    log_types = set(filters.get('log_types') or ())
+    start = filters['start'].strftime('%Y-%m-%d %H:%M:%S') if filters.get('start') else None
+    end = filters['end'].strftime('%Y-%m-%d %H:%M:%S') if filters.get('end') else None
+    terms = [term.lower() for term in filters.get('q', '').split()]
+    return [
+        entry for entry in entries
+        if (not log_types or entry.get('log_type') in log_types)
+        and (start is None or (entry.get('timestamp') or '') >= start)
+        and (end is None or (entry.get('timestamp') or '') < end)
+        and all(term in (entry.get('content') or '').lower() for term in terms)
+    ]
+
+
+def ensure_log_schema(engine, fulltext=True):
+    """Bring an existing library_log table up to date, plus the FULLTEXT index on MySQL"""
+    existing = ensure_table_schema(engine, LibraryLog.__table__)
+    if fulltext and engine.dialect.name == 'mysql' and FULLTEXT_INDEX_NAME not in existing:
+        with engine.begin() as connection:
+            connection.execute(text(f'CREATE FULLTEXT INDEX {FULLTEXT_INDEX_NAME} ON library_log (content)'))
+        print(f"Created index {FULLTEXT_INDEX_NAME}")
@@ -1,4 +1,6 @@
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session, with_loader_criteria
 from .extensions import db, bcrypt
 
 
@@ -14,6 +16,13 @@ book_publishers = db.Table('book_publishers',
     db.Column('publisher_id', db.Integer, db.ForeignKey('publisher.id'), primary_key=True)
 )
 
+def _default_available_copies(context):
+    """New books start with every copy on the shelf"""
+    params = context.get_current_parameters()
+    if params.get('status') == 'Issued':
+        return 0
+    return params.get('copies') or 1
+
 class Book(db.Model):
     # 1. library_id (auto-generated primary key)
     id = db.Column(db.Integer, primary_key=True)
@@ -41,6 +50,8 @@ class Book(db.Model):
 
     # 9. copies (optional, default 1)
     copies = db.Column(db.Integer, default=1)
+    # Copies currently on the shelf; only changed through atomic conditional UPDATEs
+    available_copies = db.Column(db.Integer, default=_default_available_copies)
 
     # 10. status (optional, default Available)
     status = db.Column(db.String(20), default='Available')  # Available, Issued
@@ -53,7 +64,13 @@ class Book(db.Model):
 
     # System fields
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    # Set by bulk delete; the background purger removes the row later
+    deleted_at = db.Column(db.DateTime, index=True)
+    # Optimistic concurrency: UPDATEs carry "WHERE version = <loaded version>"
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    __mapper_args__ = {'version_id_col': version}
 
     # Relationships
     category = db.relationship('Category', backref='books')
@@ -71,11 +88,13 @@ class Book(db.Model):
             'publisher': self.publisher.name if self.publisher else None,
             'year': self.year,
             'copies': self.copies,
+            'available_copies': self.available_copies,
             'status': self.status,
             'completion_status': self.completion_status,
             'note': self.note,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'version': self.version
         }
 
 class Member(db.Model):
@@ -85,6 +104,10 @@ class Member(db.Model):
     phone = db.Column(db.String(20))
     address = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    __mapper_args__ = {'version_id_col': version}
     
     # Relationships
     issue_records = db.relationship('IssueHistory', backref='member', lazy='dynamic')
@@ -96,7 +119,9 @@ class Member(db.Model):
             'email': self.email,
             'phone': self.phone,
             'address': self.address,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'version': self.version
         }
 
 class Category(db.Model):
@@ -104,13 +129,19 @@ class Category(db.Model):
     name = db.Column(db.String(50), nullable=False, unique=True)
     description = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    __mapper_args__ = {'version_id_col': version}
     
     def to_dict(self):
         return {
             'id': self.id,
             'name': self.name,
             'description': self.description,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'version': self.version
         }
 
 class Publisher(db.Model):
@@ -119,6 +150,10 @@ class Publisher(db.Model):
     address = db.Column(db.Text)
     contact_info = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    version = db.Column(db.Integer, nullable=False, default=1)
+
+    __mapper_args__ = {'version_id_col': version}
     
     def to_dict(self):
         return {
@@ -126,7 +161,9 @@ class Publisher(db.Model):
             'name': self.name,
             'address': self.address,
             'contact_info': self.contact_info,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'version': self.version
         }
 
 class IssueHistory(db.Model):
@@ -139,6 +176,7 @@ class IssueHistory(db.Model):
     status = db.Column(db.String(20), default='Pending')  # Pending, Returned
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     def to_dict(self):
         return {
@@ -146,28 +184,56 @@ class IssueHistory(db.Model):
             'book_id': self.book_id,
             'bookName': self.book.book_name if self.book else None,
             'memberName': self.member.name if self.member else None,
-            'issueDate': self.issue_date.isoformat() if self.issue_date else None,
-            'returnDate': self.return_date.isoformat() if self.return_date else None,
-            'actualReturnDate': self.actual_return_date.isoformat() if self.actual_return_date else None,
+            'issueDate': self.issue_date,
+            'returnDate': self.return_date,
+            'actualReturnDate': self.actual_return_date,
             'status': self.status,
             'notes': self.notes,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
         }
 
 class LibraryLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     content = db.Column(db.Text, nullable=False)
     log_type = db.Column(db.String(50), default='General')  # General, Book, Member, etc.
+    # Structured fields: the main entity the entry is about, who did it, and details
+    entity_type = db.Column(db.String(20))  # book, member, category, publisher
+    entity_id = db.Column(db.Integer)
+    actor_id = db.Column(db.Integer, index=True)  # user.id of the logged-in user
+    payload = db.Column(db.JSON)
+
+    __table_args__ = (
+        db.Index('ix_library_log_log_type_timestamp', 'log_type', 'timestamp'),
+        db.Index('ix_library_log_entity', 'entity_type', 'entity_id'),
+    )
     
     def to_dict(self):
         return {
             'id': self.id,
             'timestamp': self.timestamp.strftime('%Y-%m-%d %H:%M:%S') if self.timestamp else None,
             'content': self.content,
-            'log_type': self.log_type
+            'log_type': self.log_type,
+            'entity_type': self.entity_type,
+            'entity_id': self.entity_id,
+            'actor_id': self.actor_id,
+            'payload': self.payload
         }
 
+class LogEntity(db.Model):
+    """Every entity a log entry concerns; the primary key is the activity timeline index"""
+    entity_type = db.Column(db.String(20), primary_key=True)
+    entity_id = db.Column(db.Integer, primary_key=True)
+    log_id = db.Column(db.Integer, db.ForeignKey('library_log.id'), primary_key=True, index=True)
+
+class Tombstone(db.Model):
+    """A deleted row, kept so /api/changes can tell clients to drop their copy"""
+    id = db.Column(db.Integer, primary_key=True)
+    entity_type = db.Column(db.String(20), nullable=False)  # book, member, category, publisher, issue
+    entity_id = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
@@ -181,3 +247,39 @@ class User(db.Model):
         return bcrypt.check_password_hash(self.password_hash, password)
 
 
+@event.listens_for(Session, 'do_orm_execute')
+def _hide_soft_deleted_books(execute_state):
+    """Hide soft-deleted books and their issue history from every ORM read.
+
+    Pass ``execution_options(include_deleted=True)`` to see them (the purger does).
+    """
+    if (
+        not execute_state.is_select
+        or execute_state.is_column_load
+        or execute_state.is_relationship_load
+        or execute_state.execution_options.get('include_deleted', False)
+    ):
+        return
+
+    book_table = Book.__table__
+    deleted_book_ids = db.select(book_table.c.id).where(book_table.c.deleted_at.isnot(None))
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(Book, Book.deleted_at.is_(None), include_aliases=True),
+        with_loader_criteria(IssueHistory, IssueHistory.book_id.not_in(deleted_book_ids), include_aliases=True)
+    )
+
+
+# Entity type recorded in a tombstone when a row of each synced model is deleted
+TOMBSTONE_TYPES = {Book: 'book', Member: 'member', Category: 'category', Publisher: 'publisher', IssueHistory: 'issue'}
+
+
+@event.listens_for(Book, 'after_delete')
+@event.listens_for(Member, 'after_delete')
+@event.listens_for(Category, 'after_delete')
+@event.listens_for(Publisher, 'after_delete')
+@event.listens_for(IssueHistory, 'after_delete')
+def _record_tombstone(mapper, connection, target):
+    """Leave a tombstone for an ORM delete, in the same transaction (bulk deletes call record_deletions())"""
+    connection.execute(Tombstone.__table__.insert().values(
+        entity_type=TOMBSTONE_TYPES[mapper.class_], entity_id=target.id, deleted_at=datetime.utcnow()
+    ))
@@ -0,0 +1,224 @@
+#
+# Adaptive connection pool with checkout telemetry
+#
+import threading
+import time
+from collections import deque
+from flask import jsonify
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.util import queue as sqla_queue
+
+# MySQL "Too many connections" / "User already has more than max_user_connections"
+HOST_LIMIT_ERROR_CODES = (1040, 1203)
+
+
+class AdaptiveQueuePool(QueuePool):
+    """QueuePool that grows its overflow allowance while callers wait, up to a ceiling.
+
+    ``pool_size`` / ``max_overflow`` from the engine options are the floor.
+    A checkout that has waited longer than ``target_wait_ms`` raises the
+    overflow allowance by one connection, as long as the total stays under
+    ``ceiling``. After ``shrink_after`` seconds of short waits the allowance
+    steps back down; surplus connections are closed as they are returned.
+    Hitting the host's own connection limit lowers the ceiling to what the
+    host actually allows.
+    """
+
+    ceiling = 4
+    target_wait_ms = 100
+    shrink_after = 60
+    wait_slice = 0.05
+    saturation_log_interval = 60
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._base_overflow = self._max_overflow
+        self._stats_lock = threading.Lock()
+        self._waits = deque(maxlen=500)
+        self._waits_since_adjust = []
+        self._checkouts = 0
+        self._timeouts = 0
+        self._saturation_events = 0
+        self._host_limit_hits = 0
+        self._last_grow = 0.0
+        self._last_saturation_log = 0.0
+
+    def configure(self, ceiling=None, target_wait_ms=None, shrink_after=None):
+        """Apply per-app tuning (called once the engine exists)"""
+        if ceiling is not None:
+            self.ceiling = max(int(ceiling), self.size())
+        if target_wait_ms is not None:
+            self.target_wait_ms = target_wait_ms
+        if shrink_after is not None:
+            self.shrink_after = shrink_after
+
+    def recreate(self):
+        pool = super().recreate()
+        pool._base_overflow = self._base_overflow
+        pool._max_overflow = self._base_overflow
+        pool.configure(self.ceiling, self.target_wait_ms, self.shrink_after)
+        return pool
+
+    def capacity(self):
+        """Connections this pool may hold right now (persistent plus overflow)"""
+        return self.size() + self._max_overflow
+
+    def _grow(self):
+        with self._overflow_lock:
+            if self.capacity() >= self.ceiling:
+                return False
+            self._max_overflow += 1
+        self._mark_adjusted()
+        return True
+
+    def _mark_adjusted(self):
+        with self._stats_lock:
+            self._waits_since_adjust = []
+        self._last_grow = time.monotonic()
+
+    def _maybe_shrink(self):
+        if self._max_overflow <= self._base_overflow:
+            return
+        if time.monotonic() - self._last_grow < self.shrink_after:
+            return
+        with self._stats_lock:
+            recent = self._waits_since_adjust
+            quiet = not recent or sum(recent) / len(recent) < self.target_wait_ms / 4
+        if quiet:
+            with self._overflow_lock:
+                if self._max_overflow > self._base_overflow:
+                    self._max_overflow -= 1
+        # Either way, start a fresh observation window
+        self._mark_adjusted()
+
+    def _record_saturation(self, waited_ms):
+        now = time.monotonic()
+        with self._stats_lock:
+            self._saturation_events += 1
+            should_log = now - self._last_saturation_log >= self.saturation_log_interval
+            if should_log:
+                self._last_saturation_log = now
+        if should_log:
+            print(f"Connection pool saturated: waited {waited_ms:.0f}ms at ceiling {self.ceiling} "
+                  f"({self.status()}; {self._saturation_events} saturation events so far)")
+
+    def _record_checkout(self, waited_ms):
+        with self._stats_lock:
+            self._checkouts += 1
+            self._waits.append(waited_ms)
+            self._waits_since_adjust.append(waited_ms)
+
+    def _create_overflow_connection(self):
+        """Open an overflow connection; on a host connection-limit error lower the ceiling and return None"""
+        try:
+            return self._create_connection()
+        except Exception as e:
+            self._dec_overflow()
+            if getattr(e, 'args', None) and e.args[0] in HOST_LIMIT_ERROR_CODES:
+                with self._overflow_lock:
+                    self.ceiling = max(self.size(), self.checkedout())
+                    self._max_overflow = max(self.ceiling - self.size(), self._base_overflow)
+                self._host_limit_hits += 1
+                print(f"Database host connection limit reached, pool ceiling lowered to {self.ceiling}")
+                return None
+            raise
+
+    def _do_get(self):
+        if self._max_overflow == -1:
+            return super()._do_get()
+
+        started = time.monotonic()
+        deadline = started + self._timeout
+        saturated = False
+        while True:
+            if self._overflow < self._max_overflow:
+                try:
+                    entry = self._pool.get(False)
+                    break
+                except sqla_queue.Empty:
+                    pass
+                if self._inc_overflow():
+                    entry = self._create_overflow_connection()
+                    if entry is not None:
+                        break
+                continue
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                with self._stats_lock:
+                    self._timeouts += 1
+                self._record_saturation((time.monotonic() - started) * 1000)
+                raise exc.TimeoutError(
+                    "QueuePool limit of size %d overflow %d reached, "
+                    "connection timed out, timeout %0.2f"
+                    % (self.size(), self.overflow(), self._timeout),
+                    code="3o7r",
+                )
+            try:
+                entry = self._pool.get(True, min(remaining, self.wait_slice))
+                break
+            except sqla_queue.Empty:
+                pass
+
+            waited_ms = (time.monotonic() - started) * 1000
+            if waited_ms >= self.target_wait_ms and not self._grow() and not saturated:
+                saturated = True
+                self._record_saturation(waited_ms)
+
+        self._record_checkout((time.monotonic() - started) * 1000)
+        return entry
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._maybe_shrink()
+
+    def stats(self):
+        """Checkout telemetry for sizing the hosting plan"""
+        with self._stats_lock:
+            waits = sorted(self._waits)
+            stats = {
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'saturation_events': self._saturation_events,
+                'host_limit_hits': self._host_limit_hits
+            }
+        stats.update({
+            'pool_size': self.size(),
+            'capacity': self.capacity(),
+            'ceiling': self.ceiling,
+            'checked_out': self.checkedout(),
+            'checked_in': self.checkedin(),
+            'overflow': self.overflow(),
+            'recent_wait_ms': {
+                'avg': round(sum(waits) / len(waits), 2) if waits else 0,
+                'p95': round(waits[int(len(waits) * 0.95) - 1], 2) if waits else 0,
+                'max': round(waits[-1], 2) if waits else 0
+            }
+        })
+        return stats
+
+
+def register_pool_manager(app, db):
+    """Apply pool tuning from the config and expose /api/pool-stats"""
+    from .utils import token_required
+
+    with app.app_context():
+        for engine in db.engines.values():
+            if isinstance(engine.pool, AdaptiveQueuePool):
+                engine.pool.configure(
+                    ceiling=app.config.get('POOL_MAX_CONNECTIONS'),
+                    target_wait_ms=app.config.get('POOL_TARGET_WAIT_MS'),
+                    shrink_after=app.config.get('POOL_SHRINK_AFTER_SECONDS')
+                )
+
+    @app.route('/api/pool-stats', methods=['GET'])
+    @token_required
+    def get_pool_stats(current_user):
+        stats = {}
+        for key, engine in db.engines.items():
+            pool = engine.pool
+            stats[key or 'primary'] = pool.stats() if isinstance(pool, AdaptiveQueuePool) else {'status': pool.status()}
+        if 'admission' in app.extensions:
+            stats['admission'] = app.extensions['admission'].stats()
+        return jsonify(stats)
@@ -0,0 +1,97 @@
+#
+# Startup profiling: what a worker spends its cold start importing
+#
+# Both helpers run the import in a fresh interpreter (python -X importtime),
+# with AUTO_BOOTSTRAP_DATABASE=false so database bootstrap never skews the
+# numbers. Used by `flask --app app profile-startup` and benchmark.py.
+#
+import os
+import subprocess
+import sys
+import time
+
+import click
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _import_env():
+    env = dict(os.environ)
+    env['AUTO_BOOTSTRAP_DATABASE'] = 'false'
+    return env
+
+
+def profile_imports(module='app'):
+    """Import ``module`` under -X importtime; return (wall_seconds, rows).
+
+    Each row is (self_us, cumulative_us, depth, name) in import order.
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_ROOT, env=_import_env(), capture_output=True, text=True
+    )
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f'import {module} failed:\n{result.stderr[-2000:]}')
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return wall, rows
+
+
+def format_import_report(wall, rows, top=40):
+    """Plain-text report: totals, then the slowest top-level packages and modules"""
+    top_level = {}
+    for self_us, cumulative_us, depth, name in rows:
+        package = name.split('.')[0]
+        if depth == 0 or name == package:
+            top_level[package] = max(top_level.get(package, 0), cumulative_us)
+
+    lines = [
+        f'Cold start (interpreter + import app): {wall * 1000:.0f} ms',
+        f'Modules imported: {len(rows)}',
+        '',
+        'Slowest packages (cumulative ms)',
+    ]
+    for package, cumulative_us in sorted(top_level.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f'  {cumulative_us / 1000:9.1f}  {package}')
+    lines += ['', 'Slowest modules (self ms)']
+    for self_us, cumulative_us, depth, name in sorted(rows, key=lambda row: -row[0])[:top]:
+        lines.append(f'  {self_us / 1000:9.1f}  {name}')
+    return '\n'.join(lines) + '\n'
+
+
+def measure_cold_start(module='app', runs=5):
+    """Wall-clock seconds for ``runs`` fresh interpreters each importing ``module``"""
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(
+            [sys.executable, '-c', f'import {module}'],
+            cwd=PROJECT_ROOT, env=_import_env(), check=True,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def register_profiling_commands(app):
+    """Add `flask profile-startup`"""
+
+    @app.cli.command('profile-startup')
+    @click.option('--output', default='startup_profile.txt', help='Where to save the report')
+    @click.option('--top', default=40, help='Rows per section')
+    def profile_startup_command(output, top):
+        """Save an -X importtime report for a worker cold start"""
+        wall, rows = profile_imports('app')
+        report = format_import_report(wall, rows, top)
+        with open(output, 'w', encoding='utf-8') as report_file:
+            report_file.write(report)
+        print(report)
+        print(f'Report saved to {output}')
@@ -0,0 +1,178 @@
+#
+# Background purge of soft-deleted books
+#
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import delete, func, select, update
+from .extensions import db
+from .models import Book, IssueHistory
+from .changes import record_deletions
+
+_purge_lock = threading.Lock()
+_purge_thread = None
+_purge_progress = {
+    'running': False,
+    'purged_books': 0,
+    'purged_history': 0,
+    'chunks': 0,
+    'started_at': None,
+    'finished_at': None,
+    'last_error': None
+}
+
+
+def _chunks(items, size):
+    """Yield successive slices of at most ``size`` items"""
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def soft_delete_books(book_ids, chunk_size):
+    """Mark books deleted in bounded UPDATE statements. Returns the number of rows marked.
+
+    The books and their (now hidden) issue records get tombstones for /api/changes.
+    """
+    now = datetime.utcnow()
+    marked = 0
+    for chunk in _chunks(book_ids, chunk_size):
+        # Already soft-deleted books are hidden from this select
+        live_ids = db.session.execute(select(Book.id).where(Book.id.in_(chunk))).scalars().all()
+        if not live_ids:
+            continue
+        history_ids = db.session.execute(
+            select(IssueHistory.id).where(IssueHistory.book_id.in_(live_ids))
+        ).scalars().all()
+        result = db.session.execute(
+            update(Book)
+            .where(Book.id.in_(live_ids), Book.deleted_at.is_(None))
+            .values(deleted_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        marked += result.rowcount
+        record_deletions('book', live_ids)
+        record_deletions('issue', history_ids)
+    return marked
+
+
+def pending_purge_count():
+    """Number of soft-deleted books still waiting to be purged"""
+    return db.session.execute(
+        select(func.count(Book.id))
+        .where(Book.deleted_at.isnot(None))
+        .execution_options(include_deleted=True)
+    ).scalar()
+
+
+def _purge_next_chunk(chunk_size):
+    """Hard-delete one chunk of soft-deleted books and their history. Returns the number of books removed."""
+    book_ids = db.session.execute(
+        select(Book.id)
+        .where(Book.deleted_at.isnot(None))
+        .order_by(Book.id)
+        .limit(chunk_size)
+        .execution_options(include_deleted=True)
+    ).scalars().all()
+    if not book_ids:
+        return 0
+
+    history_result = db.session.execute(
+        delete(IssueHistory)
+        .where(IssueHistory.book_id.in_(book_ids))
+        .execution_options(synchronize_session=False)
+    )
+    book_result = db.session.execute(
+        delete(Book)
+        .where(Book.id.in_(book_ids), Book.deleted_at.isnot(None))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+    with _purge_lock:
+        _purge_progress['purged_history'] += history_result.rowcount
+        _purge_progress['purged_books'] += book_result.rowcount
+        _purge_progress['chunks'] += 1
+    return len(book_ids)
+
+
+def _run_purge(app):
+    """Purge loop: one short transaction per chunk, pausing between chunks so circulation requests get the pool"""
+    chunk_size = app.config.get('PURGE_CHUNK_SIZE', 500)
+    pause = app.config.get('PURGE_PAUSE_SECONDS', 0.05)
+    try:
+        with app.app_context():
+            try:
+                while _purge_next_chunk(chunk_size):
+                    db.session.remove()
+                    time.sleep(pause)
+            except Exception as e:
+                print(f"Background purge error: {e}")
+                db.session.rollback()
+                with _purge_lock:
+                    _purge_progress['last_error'] = str(e)
+            finally:
+                db.session.remove()
+    finally:
+        with _purge_lock:
+            _purge_progress['running'] = False
+            _purge_progress['finished_at'] = datetime.utcnow().isoformat()
+
+
+def start_purge(app):
+    """Start the background purger unless one is already running in this process"""
+    global _purge_thread
+    with _purge_lock:
+        if _purge_progress['running']:
+            return False
+        _purge_progress.update({
+            'running': True,
+            'started_at': datetime.utcnow().isoformat(),
+            'finished_at': None,
+            'last_error': None
+        })
+        _purge_thread = threading.Thread(target=_run_purge, args=(app,), name='book-purge', daemon=True)
+        _purge_thread.start()
+        return True
+
+
+def resume_purge(app):
+    """Start the purger if soft-deleted books are still waiting (e.g. left by a restart mid-purge)"""
+    if pending_purge_count() == 0:
+        return False
+    return start_purge(app)
+
+
+def purge_status(scheduled=False):
+    """Snapshot of this process's purge progress plus the pending count from the database.
+
+    ``scheduled`` reports a purge that starts once the current request commits.
+    """
+    with _purge_lock:
+        status = dict(_purge_progress)
+    if scheduled and not status['running']:
+        status.update(running=True, started_at=None, finished_at=None, last_error=None)
+    status['pending_books'] = pending_purge_count()
+    return status
+
+
+def register_purge_commands(app):
+    """Add `flask purge-books`"""
+
+    @app.cli.command('purge-books')
+    def purge_books_command():
+        """Hard-delete the soft-deleted books still waiting to be purged"""
+        with app.app_context():
+            pending = pending_purge_count()
+        if not pending:
+            print("No soft-deleted books waiting to be purged")
+            return
+        print(f"Purging {pending} soft-deleted books...")
+        with _purge_lock:
+            _purge_progress.update({'running': True, 'started_at': datetime.utcnow().isoformat()})
+        _run_purge(app)
+        with app.app_context():
+            status = purge_status()
+        print(f"Purged {status['purged_books']} books and {status['purged_history']} issue records, "
+              f"{status['pending_books']} still pending")
+        if status['last_error']:
+            print(f"Purge stopped on error: {status['last_error']}")
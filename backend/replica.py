@@ -0,0 +1,63 @@
+#
+# Read-replica routing for read-only handlers
+#
+import time
+from functools import wraps
+from flask import g, request, has_request_context
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND_KEY = 'replica'
+STICKY_COOKIE = 'lms_primary_until'
+
+
+class RoutingSession(Session):
+    """Session that sends statements from @use_replica handlers to the replica engine.
+
+    Flushes always go to the primary, and without a configured replica bind
+    everything behaves exactly like the stock Flask-SQLAlchemy session.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and g.get('use_replica'):
+            engine = self._db.engines.get(REPLICA_BIND_KEY)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def wrote_recently():
+    """True while the client is inside the read-your-writes window after its own write"""
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def use_replica(f):
+    """Route a read-only handler to the replica, unless this client wrote recently"""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not wrote_recently():
+            g.use_replica = True
+        return f(*args, **kwargs)
+    return decorated
+
+
+def register_replica_routing(app):
+    """Pin clients to the primary for REPLICA_STICKY_SECONDS after each successful write"""
+    if REPLICA_BIND_KEY not in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        return
+
+    sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 5)
+
+    @app.after_request
+    def stick_to_primary_after_write(response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+            response.set_cookie(
+                STICKY_COOKIE,
+                str(time.time() + sticky_seconds),
+                max_age=sticky_seconds,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
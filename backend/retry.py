@@ -0,0 +1,69 @@
+#
+# Transparent retry of idempotent reads after a dropped database connection
+#
+import random
+import time
+from functools import wraps
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.exc import DBAPIError
+
+
+def _on_db_error(context):
+    """Invalidate only the broken connection, and note the disconnect for @retry_idempotent"""
+    if context.is_disconnect:
+        context.invalidate_pool_on_disconnect = False
+        if has_request_context():
+            g.db_disconnected = True
+
+
+def register_disconnect_handling(app, db):
+    """Listen for disconnect errors on every engine"""
+    with app.app_context():
+        for engine in db.engines.values():
+            if not event.contains(engine, 'handle_error', _on_db_error):
+                event.listen(engine, 'handle_error', _on_db_error)
+
+
+def retry_idempotent(f):
+    """Re-run a GET handler once, after a short jittered pause, if it hit a dropped connection.
+
+    Handlers here usually catch their own errors and answer 503, so the
+    disconnect is detected through the flag set by the engine's handle_error
+    hook as well as by the exception itself.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return f(*args, **kwargs)
+
+        from .extensions import db
+
+        g.pop('db_disconnected', None)
+        try:
+            response = f(*args, **kwargs)
+        except DBAPIError as e:
+            if not e.connection_invalidated:
+                raise
+            g.db_disconnected = True
+            response = None
+
+        if not g.pop('db_disconnected', False):
+            return response
+        if response is not None:
+            # The handler may have recovered on its own (check_database_connection retries)
+            response = current_app.make_response(response)
+            if response.status_code < 500:
+                return response
+
+        print(f"Database connection dropped during {request.path}, retrying once")
+        try:
+            db.session.rollback()
+        except Exception:
+            pass
+        db.session.remove()
+        g.pop('database_checked', None)
+        low, high = current_app.config.get('DISCONNECT_RETRY_BACKOFF', (0.05, 0.25))
+        time.sleep(random.uniform(low, high))
+        return f(*args, **kwargs)
+    return decorated
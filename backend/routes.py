@@ -1,4 +1,10 @@
-from flask import request, jsonify
+import csv
+import io
+import tempfile
+import traceback
+from flask import request, jsonify, send_file, Response
+from sqlalchemy import text
+from .extensions import cache
 from .models import db, Book, Member, Category, Publisher, IssueHistory, LibraryLog
 from datetime import datetime, date
 import json
@@ -6,22 +12,39 @@ import json
 import os
 from werkzeug.utils import secure_filename
 from sqlalchemy.exc import IntegrityError
-from .utils import token_required
+from sqlalchemy.orm.exc import StaleDataError
+from .utils import token_required, check_if_match, with_etag, check_database_connection, load_openpyxl
+from .purge import soft_delete_books, start_purge, resume_purge, purge_status
+from .replica import use_replica
+from .singleflight import coalesce
+from .retry import retry_idempotent
+from .transaction import on_commit
+from .inventory import checkout_copy, checkin_copy, close_issue_record, adjust_copies
+from .warmup import run_warm_up
+from .batch import batch_paths, run_batch, BatchError
+from .changes import parse_since, changes_since, ChangeTokenError
+from .log_archive import read_archive, list_archives
+from .activity import log_activity, activity_page
+from .wire_format import requested_format, encode_list_response, WireFormatError, ISSUE_DICTIONARY_KEYS
+from .fieldsets import requested_fields, select_fields, rows_to_dicts, sparse_dicts, FieldsetError
+from .log_search import parse_log_filters, apply_log_filters, filter_archived, fulltext_available, LogFilterError
 
 def register_routes(app):
     # Utility function to add log entries
-    def add_log_entry(content, log_type='General'):
-        log = LibraryLog(content=content, log_type=log_type)
-        db.session.add(log)
+    def add_log_entry(content, log_type='General', entity=None, related=(), payload=None):
+        log_activity(content, log_type, entity=entity, related=related, payload=payload)
         db.session.commit()
 
     # Dashboard API  
     @app.route('/api/dashboard', methods=['GET'])
+    @use_replica
+    @cache.cached('book', 'category')
+    @coalesce
+    @retry_idempotent
     def get_dashboard_stats():
         try:
             # Simple database connection test
             try:
-                from sqlalchemy import text
                 db.session.execute(text('SELECT 1'))
                 db.session.commit()
             except Exception as db_error:
@@ -48,13 +71,24 @@ def register_routes(app):
 
     # Books API
     @app.route('/api/books', methods=['GET'])
+    @use_replica
+    @cache.cached('book', 'category', 'publisher')
+    @coalesce
+    @retry_idempotent
     def get_books():
         try:
             # Check database connection health first
-            from app import check_database_connection
             if not check_database_connection():
                 return jsonify({'error': 'Database connection issue, please try again'}), 503
                 
+            try:
+                fields = requested_fields(request.args, 'book')
+                wire_format = requested_format(request)
+            except FieldsetError as e:
+                return jsonify({'error': str(e)}), 400
+            except WireFormatError as e:
+                return jsonify({'error': str(e)}), e.status_code
+                
             page = request.args.get('page', 1, type=int)
             per_page = request.args.get('per_page', 100, type=int)
             
@@ -65,8 +99,8 @@ def register_routes(app):
             publisher = request.args.get('publisher', '')
             status = request.args.get('status', '')
             
-            # Build query with filters
-            query = Book.query
+            # Build query with filters (only the requested columns when ?fields= is given)
+            query = select_fields(Book.query, 'book', fields) if fields else Book.query
             
             if book_name:
                 query = query.filter(Book.book_name.ilike(f'%{book_name}%'))
@@ -87,15 +121,18 @@ def register_routes(app):
                 page=page, per_page=per_page, error_out=False
             )
             
-            books = [book.to_dict() for book in pagination.items]
+            if fields:
+                books = rows_to_dicts(pagination.items, 'book', fields)
+            else:
+                books = [book.to_dict() for book in pagination.items]
             
-            return jsonify({
+            return encode_list_response({
                 'books': books,
                 'total': pagination.total,
                 'pages': pagination.pages,
                 'current_page': page,
                 'per_page': per_page
-            })
+            }, 'books', wire_format)
         except Exception as e:
             # Log the error for debugging
             print(f"Books API error: {e}")
@@ -145,7 +182,8 @@ def register_routes(app):
             db.session.add(book)
             db.session.commit()
 
-            add_log_entry(f'New book "{data["bookName"]}" added to library', 'Book')
+            add_log_entry(f'New book "{data["bookName"]}" added to library', 'Book', entity=book,
+                          payload={'action': 'created'})
 
             return jsonify(book.to_dict()), 201
         except Exception as e:
@@ -153,15 +191,15 @@ def register_routes(app):
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/books/<int:book_id>', methods=['GET'])
+    @retry_idempotent
     def get_book(book_id):
         try:
             # Check database connection health first
-            from app import check_database_connection
             if not check_database_connection():
                 return jsonify({'error': 'Database connection issue, please try again'}), 503
                 
             book = Book.query.get_or_404(book_id)
-            return jsonify(book.to_dict())
+            return with_etag(jsonify(book.to_dict()), book)
         except Exception as e:
             # Log the error for debugging
             print(f"Get book API error: {e}")
@@ -172,6 +210,9 @@ def register_routes(app):
     def update_book(current_user, book_id):
         try:
             book = Book.query.get_or_404(book_id)
+            conflict = check_if_match(book)
+            if conflict:
+                return conflict
             data = request.get_json()
             
             # Update fields
@@ -200,15 +241,21 @@ def register_routes(app):
                     book.publisher_id = None
             if 'year' in data:
                 book.year = data['year']
+            if 'copies' in data:
+                adjust_copies(book, int(data['copies'] or 1))
             if 'note' in data:
                 book.note = data['note']
             
             book.updated_at = datetime.utcnow()
             db.session.commit()
             
-            add_log_entry(f'Book "{book.book_name}" details updated', 'Book')
+            add_log_entry(f'Book "{book.book_name}" details updated', 'Book', entity=book,
+                          payload={'action': 'updated', 'fields': sorted(data.keys())})
             
-            return jsonify(book.to_dict())
+            return with_etag(jsonify(book.to_dict()), book)
+        except StaleDataError:
+            db.session.rollback()
+            return jsonify({'error': 'This record was changed by someone else. Reload it and try again.'}), 409
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': str(e)}), 500
@@ -223,7 +270,8 @@ def register_routes(app):
             db.session.delete(book)
             db.session.commit()
             
-            add_log_entry(f'Book "{book_name}" deleted from library', 'Book')
+            add_log_entry(f'Book "{book_name}" deleted from library', 'Book', entity=('book', book_id),
+                          payload={'action': 'deleted', 'book_name': book_name})
             
             return jsonify({'message': 'Book deleted successfully'})
         except Exception as e:
@@ -238,14 +286,16 @@ def register_routes(app):
             book = Book.query.get_or_404(book_id)
             data = request.get_json()
             
-            if book.status == 'Issued':
-                return jsonify({'error': 'Book is already issued'}), 400
-            
             # Get member
             member = Member.query.filter_by(name=data['memberName']).first()
             if not member:
                 return jsonify({'error': 'Member not found'}), 404
             
+            # Take one copy atomically; fails when every copy is already out
+            if not checkout_copy(book.id):
+                db.session.rollback()
+                return jsonify({'error': 'No copies of this book are available'}), 400
+            
             # Create issue record
             issue_record = IssueHistory(
                 book_id=book.id,
@@ -255,13 +305,13 @@ def register_routes(app):
                 status='Pending'
             )
             
-            # Update book status
-            book.status = 'Issued'
-            
             db.session.add(issue_record)
             db.session.commit()
             
-            add_log_entry(f'Book "{book.book_name}" issued to {member.name}. Expected return: {data["returnDate"]}', 'Issue')
+            add_log_entry(f'Book "{book.book_name}" issued to {member.name}. Expected return: {data["returnDate"]}', 'Issue',
+                          entity=book, related=[member],
+                          payload={'action': 'issued', 'issue_id': issue_record.id,
+                                   'issue_date': data['issueDate'], 'return_date': data['returnDate']})
             
             return jsonify(issue_record.to_dict()), 201
         except Exception as e:
@@ -275,28 +325,32 @@ def register_routes(app):
             book = Book.query.get_or_404(book_id)
             data = request.get_json()
             
-            if book.status == 'Available':
-                return jsonify({'error': 'Book is already available'}), 400
-            
-            # Find pending issue record
-            issue_record = IssueHistory.query.filter_by(
-                book_id=book.id, 
-                status='Pending'
-            ).first()
+            # Find pending issue record; with several copies out the caller
+            # can name the record or the member, otherwise the oldest loan is returned
+            query = IssueHistory.query.filter_by(book_id=book.id, status='Pending')
+            if data.get('issueId'):
+                query = query.filter(IssueHistory.id == data['issueId'])
+            elif data.get('memberName'):
+                query = query.join(Member).filter(Member.name == data['memberName'])
+            issue_record = query.order_by(IssueHistory.issue_date, IssueHistory.id).first()
             
             if not issue_record:
                 return jsonify({'error': 'No pending issue record found'}), 404
             
-            # Update issue record
-            issue_record.status = 'Returned'
-            issue_record.actual_return_date = datetime.strptime(data['actualReturnDate'], '%Y-%m-%d').date()
+            actual_return_date = datetime.strptime(data['actualReturnDate'], '%Y-%m-%d').date()
             
-            # Update book status
-            book.status = 'Available'
+            # Close the record and put the copy back, both as conditional UPDATEs
+            if not close_issue_record(issue_record.id, actual_return_date):
+                db.session.rollback()
+                return jsonify({'error': 'Book has already been returned'}), 400
+            checkin_copy(book.id)
             
             db.session.commit()
             
-            add_log_entry(f'Book "{book.book_name}" returned by {issue_record.member.name} on {data["actualReturnDate"]}', 'Return')
+            add_log_entry(f'Book "{book.book_name}" returned by {issue_record.member.name} on {data["actualReturnDate"]}', 'Return',
+                          entity=book, related=[('member', issue_record.member_id)],
+                          payload={'action': 'returned', 'issue_id': issue_record.id,
+                                   'actual_return_date': data['actualReturnDate']})
             
             return jsonify(issue_record.to_dict())
         except Exception as e:
@@ -305,13 +359,20 @@ def register_routes(app):
 
     # Members API
     @app.route('/api/members', methods=['GET'])
+    @retry_idempotent
     def get_members():
         try:
             # Check database connection health first
-            from app import check_database_connection
             if not check_database_connection():
                 return jsonify({'error': 'Database connection issue, please try again'}), 503
                 
+            try:
+                fields = requested_fields(request.args, 'member')
+            except FieldsetError as e:
+                return jsonify({'error': str(e)}), 400
+            if fields:
+                return jsonify(rows_to_dicts(select_fields(Member.query, 'member', fields).all(), 'member', fields))
+            
             members = Member.query.all()
             return jsonify([member.to_dict() for member in members])
         except Exception as e:
@@ -338,7 +399,8 @@ def register_routes(app):
             db.session.add(member)
             db.session.commit()
             
-            add_log_entry(f'New member "{data["name"]}" added', 'Member')
+            add_log_entry(f'New member "{data["name"]}" added', 'Member', entity=member,
+                          payload={'action': 'created'})
             
             return jsonify(member.to_dict()), 201
         except Exception as e:
@@ -364,7 +426,8 @@ def register_routes(app):
             db.session.delete(member)
             db.session.commit()
             
-            add_log_entry(f'Member "{member_name}" deleted', 'Member')
+            add_log_entry(f'Member "{member_name}" deleted', 'Member', entity=('member', member_id),
+                          payload={'action': 'deleted', 'name': member_name})
             
             return jsonify({'message': 'Member deleted successfully'})
         except Exception as e:
@@ -373,13 +436,21 @@ def register_routes(app):
 
     # Categories API
     @app.route('/api/categories', methods=['GET'])
+    @cache.cached('category')
+    @retry_idempotent
     def get_categories():
         try:
             # Check database connection health first
-            from app import check_database_connection
             if not check_database_connection():
                 return jsonify({'error': 'Database connection issue, please try again'}), 503
                 
+            try:
+                fields = requested_fields(request.args, 'category')
+            except FieldsetError as e:
+                return jsonify({'error': str(e)}), 400
+            if fields:
+                return jsonify(rows_to_dicts(select_fields(Category.query, 'category', fields).all(), 'category', fields))
+            
             categories = Category.query.all()
             return jsonify([category.to_dict() for category in categories])
         except Exception as e:
@@ -404,7 +475,8 @@ def register_routes(app):
             db.session.add(category)
             db.session.commit()
             
-            add_log_entry(f'New category "{data["name"]}" added', 'Category')
+            add_log_entry(f'New category "{data["name"]}" added', 'Category', entity=category,
+                          payload={'action': 'created'})
             
             return jsonify(category.to_dict()), 201
         except Exception as e:
@@ -416,6 +488,9 @@ def register_routes(app):
     def update_category(current_user, category_id):
         try:
             category = Category.query.get_or_404(category_id)
+            conflict = check_if_match(category)
+            if conflict:
+                return conflict
             data = request.get_json()
             
             if 'name' in data:
@@ -430,9 +505,13 @@ def register_routes(app):
             
             db.session.commit()
             
-            add_log_entry(f'Category "{category.name}" updated', 'Category')
+            add_log_entry(f'Category "{category.name}" updated', 'Category', entity=category,
+                          payload={'action': 'updated', 'fields': sorted(data.keys())})
             
-            return jsonify(category.to_dict())
+            return with_etag(jsonify(category.to_dict()), category)
+        except StaleDataError:
+            db.session.rollback()
+            return jsonify({'error': 'This record was changed by someone else. Reload it and try again.'}), 409
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': str(e)}), 500
@@ -452,7 +531,8 @@ def register_routes(app):
             db.session.delete(category)
             db.session.commit()
             
-            add_log_entry(f'Category "{category_name}" deleted', 'Category')
+            add_log_entry(f'Category "{category_name}" deleted', 'Category', entity=('category', category_id),
+                          payload={'action': 'deleted', 'name': category_name})
             
             return jsonify({'message': 'Category deleted successfully'})
         except Exception as e:
@@ -461,13 +541,21 @@ def register_routes(app):
 
     # Publishers API
     @app.route('/api/publishers', methods=['GET'])
+    @cache.cached('publisher')
+    @retry_idempotent
     def get_publishers():
         try:
             # Check database connection health first
-            from app import check_database_connection
             if not check_database_connection():
                 return jsonify({'error': 'Database connection issue, please try again'}), 503
                 
+            try:
+                fields = requested_fields(request.args, 'publisher')
+            except FieldsetError as e:
+                return jsonify({'error': str(e)}), 400
+            if fields:
+                return jsonify(rows_to_dicts(select_fields(Publisher.query, 'publisher', fields).all(), 'publisher', fields))
+            
             publishers = Publisher.query.all()
             return jsonify([publisher.to_dict() for publisher in publishers])
         except Exception as e:
@@ -493,7 +581,8 @@ def register_routes(app):
             db.session.add(publisher)
             db.session.commit()
             
-            add_log_entry(f'New publisher "{data["name"]}" added', 'Publisher')
+            add_log_entry(f'New publisher "{data["name"]}" added', 'Publisher', entity=publisher,
+                          payload={'action': 'created'})
             
             return jsonify(publisher.to_dict()), 201
         except Exception as e:
@@ -505,6 +594,9 @@ def register_routes(app):
     def update_publisher(current_user, publisher_id):
         try:
             publisher = Publisher.query.get_or_404(publisher_id)
+            conflict = check_if_match(publisher)
+            if conflict:
+                return conflict
             data = request.get_json()
             
             if 'name' in data:
@@ -521,9 +613,13 @@ def register_routes(app):
             
             db.session.commit()
             
-            add_log_entry(f'Publisher "{publisher.name}" updated', 'Publisher')
+            add_log_entry(f'Publisher "{publisher.name}" updated', 'Publisher', entity=publisher,
+                          payload={'action': 'updated', 'fields': sorted(data.keys())})
             
-            return jsonify(publisher.to_dict())
+            return with_etag(jsonify(publisher.to_dict()), publisher)
+        except StaleDataError:
+            db.session.rollback()
+            return jsonify({'error': 'This record was changed by someone else. Reload it and try again.'}), 409
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': str(e)}), 500
@@ -543,7 +639,8 @@ def register_routes(app):
             db.session.delete(publisher)
             db.session.commit()
             
-            add_log_entry(f'Publisher "{publisher_name}" deleted', 'Publisher')
+            add_log_entry(f'Publisher "{publisher_name}" deleted', 'Publisher', entity=('publisher', publisher_id),
+                          payload={'action': 'deleted', 'name': publisher_name})
             
             return jsonify({'message': 'Publisher deleted successfully'})
         except Exception as e:
@@ -555,6 +652,9 @@ def register_routes(app):
     def update_member(current_user, member_id):
         try:
             member = Member.query.get_or_404(member_id)
+            conflict = check_if_match(member)
+            if conflict:
+                return conflict
             data = request.get_json()
             
             if 'name' in data:
@@ -573,38 +673,54 @@ def register_routes(app):
             
             db.session.commit()
             
-            add_log_entry(f'Member "{member.name}" details updated', 'Member')
+            add_log_entry(f'Member "{member.name}" details updated', 'Member', entity=member,
+                          payload={'action': 'updated', 'fields': sorted(data.keys())})
             
-            return jsonify(member.to_dict())
+            return with_etag(jsonify(member.to_dict()), member)
+        except StaleDataError:
+            db.session.rollback()
+            return jsonify({'error': 'This record was changed by someone else. Reload it and try again.'}), 409
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': str(e)}), 500
 
     # Issue History API
     @app.route('/api/issue-history', methods=['GET'])
+    @retry_idempotent
     def get_issue_history():
         try:
             # Check database connection health first
-            from app import check_database_connection
             if not check_database_connection():
                 return jsonify({'error': 'Database connection issue, please try again'}), 503
                 
+            try:
+                fields = requested_fields(request.args, 'issue')
+                wire_format = requested_format(request)
+            except FieldsetError as e:
+                return jsonify({'error': str(e)}), 400
+            except WireFormatError as e:
+                return jsonify({'error': str(e)}), e.status_code
+                
             page = request.args.get('page', 1, type=int)
             per_page = request.args.get('per_page', 100, type=int)
             
-            pagination = IssueHistory.query.paginate(
+            query = select_fields(IssueHistory.query, 'issue', fields) if fields else IssueHistory.query
+            pagination = query.paginate(
                 page=page, per_page=per_page, error_out=False
             )
             
-            history = [record.to_dict() for record in pagination.items]
+            if fields:
+                history = rows_to_dicts(pagination.items, 'issue', fields)
+            else:
+                history = [record.to_dict() for record in pagination.items]
             
-            return jsonify({
+            return encode_list_response({
                 'history': history,
                 'total': pagination.total,
                 'pages': pagination.pages,
                 'current_page': page,
                 'per_page': per_page
-            })
+            }, 'history', wire_format, ISSUE_DICTIONARY_KEYS)
         except Exception as e:
             # Log the error for debugging
             print(f"Issue history API error: {e}")
@@ -612,23 +728,56 @@ def register_routes(app):
 
     # Library Log API
     @app.route('/api/library-log', methods=['GET'])
+    @use_replica
+    @retry_idempotent
     def get_library_log():
         try:
             # Check database connection health first
-            from app import check_database_connection
             if not check_database_connection():
                 return jsonify({'error': 'Database connection issue, please try again'}), 503
                 
             page = request.args.get('page', 1, type=int)
             per_page = request.args.get('per_page', 100, type=int)
             
-            query = LibraryLog.query.order_by(LibraryLog.timestamp.desc())
+            try:
+                filters = parse_log_filters(request.args)
+                fields = requested_fields(request.args, 'log')
+            except (LogFilterError, FieldsetError) as e:
+                return jsonify({'error': str(e)}), 400
+            
+            # Archived months are read from their segment on request
+            month = request.args.get('archive')
+            if month:
+                entries = read_archive(app, month)
+                if entries is None:
+                    return jsonify({'error': f'No archived log for {month}'}), 404
+                entries = filter_archived(entries, filters)
+                if fields:
+                    entries = sparse_dicts(entries, fields)
+                start = (page - 1) * per_page
+                return jsonify({
+                    'logs': entries[start:start + per_page],
+                    'total': len(entries),
+                    'pages': (len(entries) + per_page - 1) // per_page,
+                    'current_page': page,
+                    'per_page': per_page,
+                    'archive': month
+                })
+            
+            query = select_fields(LibraryLog.query, 'log', fields) if fields else LibraryLog.query
+            query = apply_log_filters(
+                query, filters,
+                use_fulltext=bool(filters.get('q')) and fulltext_available(db.session)
+            ).order_by(LibraryLog.timestamp.desc())
             
             pagination = query.paginate(
                 page=page, per_page=per_page, error_out=False
             )
             
-            logs = [log.to_dict() for log in pagination.items]
+            if fields:
+                logs = rows_to_dicts(pagination.items, 'log', fields)
+            else:
+                logs = [log.to_dict() for log in pagination.items]
             
             return jsonify({
                 'logs': logs,
@@ -642,13 +791,44 @@ def register_routes(app):
             print(f"Library log API error: {e}")
             return jsonify({'error': 'Database connection issue, please try again'}), 503
 
+    # Per-entity activity timelines (keyset pagination: pass next_before back as ?before=)
+    def entity_activity(entity_type, entity_id):
+        try:
+            return jsonify(activity_page(
+                entity_type, entity_id,
+                before=request.args.get('before', type=int),
+                limit=request.args.get('limit', 50, type=int)
+            ))
+        except Exception as e:
+            print(f"Activity API error: {e}")
+            return jsonify({'error': 'Database connection issue, please try again'}), 503
+
+    @app.route('/api/books/<int:book_id>/activity', methods=['GET'])
+    @use_replica
+    @retry_idempotent
+    def get_book_activity(book_id):
+        return entity_activity('book', book_id)
+
+    @app.route('/api/members/<int:member_id>/activity', methods=['GET'])
+    @use_replica
+    @retry_idempotent
+    def get_member_activity(member_id):
+        return entity_activity('member', member_id)
+
+    # Archived library log months
+    @app.route('/api/library-log/archives', methods=['GET'])
+    def get_library_log_archives():
+        return jsonify({
+            'archives': list_archives(app),
+            'retention_days': app.config.get('LOG_RETENTION_DAYS', 90)
+        })
+
     # Add Library Log Entry API
     @app.route('/api/library-log', methods=['POST'])
     @token_required
     def add_library_log_entry(current_user):
         try:
             # Check database connection health first
-            from app import check_database_connection
             if not check_database_connection():
                 return jsonify({'error': 'Database connection issue, please try again'}), 503
             
@@ -678,7 +858,6 @@ def register_routes(app):
         except Exception as e:
             db.session.rollback()
             print(f"Add library log error: {e}")
-            import traceback
             traceback.print_exc()
             return jsonify({'error': 'Failed to add log entry'}), 500
 
@@ -700,8 +879,6 @@ def register_routes(app):
             # Read CSV file with UTF-8 encoding for international characters
             try:
                 # Save uploaded file temporarily to read with proper encoding
-                import tempfile
-                import os
                 temp_path = None
 
                 # Determine file type and set appropriate suffix
@@ -719,7 +896,7 @@ def register_routes(app):
                 if file.filename.lower().endswith('.xlsx'):
                     # Read Excel file
                     try:
-                        import openpyxl
+                        openpyxl = load_openpyxl()
                         workbook = openpyxl.load_workbook(temp_path)
                         worksheet = workbook.active
                         
@@ -735,7 +912,6 @@ def register_routes(app):
                         return jsonify({'error': 'Excel support requires openpyxl. Please install it or use CSV format.'}), 400
                 else:
                     # Read CSV with UTF-8 encoding using built-in csv module
-                    import csv
                     with open(temp_path, 'r', encoding='utf-8') as csvfile:
                         reader = csv.DictReader(csvfile)
                         csv_data = list(reader)
@@ -750,7 +926,7 @@ def register_routes(app):
                     if temp_path and os.path.exists(temp_path):
                         if file.filename.lower().endswith('.xlsx'):
                             # Try Excel with different encoding
-                            import openpyxl
+                            openpyxl = load_openpyxl()
                             workbook = openpyxl.load_workbook(temp_path)
                             worksheet = workbook.active
                             headers = [cell.value for cell in worksheet[1]]
@@ -782,6 +958,8 @@ def register_routes(app):
             errors = []
 
             updated_count = 0
+            imported_books = []
+            updated_books = []
 
             for index, row in enumerate(csv_data):
                 try:
@@ -851,11 +1029,11 @@ def register_routes(app):
 
                         copies_val = safe_int(row.get('Copies'))
                         if copies_val:
-                            existing_book.copies = copies_val
+                            adjust_copies(existing_book, copies_val)
 
-                        status_val = safe_str(row.get('Status'))
-                        if status_val:
-                            existing_book.status = status_val
+                        # Availability follows the shelf count; the CSV's Status column cannot override it
+                        if existing_book.available_copies is not None:
+                            existing_book.status = 'Issued' if existing_book.available_copies == 0 else 'Available'
 
                         completion_val = safe_str(row.get('Completion Status'))
                         if completion_val:
@@ -865,6 +1043,7 @@ def register_routes(app):
                         if note_val:
                             existing_book.note = note_val
 
+                        updated_books.append(existing_book)
                         updated_count += 1
                     else:
                         # CREATE new book with safe data handling
@@ -898,17 +1077,25 @@ def register_routes(app):
                         )
 
                         db.session.add(book)
+                        imported_books.append(book)
                         imported_count += 1
 
                 except Exception as e:
                     errors.append(f'Row {index + 2}: {str(e)}')
 
             if imported_count > 0 or updated_count > 0:
+                # Ids are assigned by the flush; read them before commit expires the objects
+                db.session.flush()
+                links = app.config['BULK_LOG_LINKS']
+                imported_ids = [('book', book.id) for book in imported_books[:links]]
+                updated_ids = [('book', book.id) for book in updated_books[:links]]
                 db.session.commit()
                 if imported_count > 0:
-                    add_log_entry(f'{imported_count} books imported from CSV file', 'Import')
+                    add_log_entry(f'{imported_count} books imported from CSV file', 'Import', related=imported_ids,
+                                  payload={'action': 'imported', 'count': imported_count, 'filename': file.filename})
                 if updated_count > 0:
-                    add_log_entry(f'{updated_count} books updated from CSV file', 'Update')
+                    add_log_entry(f'{updated_count} books updated from CSV file', 'Update', related=updated_ids,
+                                  payload={'action': 'updated', 'count': updated_count, 'filename': file.filename})
 
             response_data = {
                 'imported_count': imported_count,
@@ -933,9 +1120,6 @@ def register_routes(app):
         try:
             print("CSV template download requested - starting simple version")
             
-            from flask import send_file, Response
-            import io
-            import csv
 
             # Create very simple CSV content
             csv_content = """Book Name,Author,Category,Editor,Volumes,Publisher,Year,Copies,Status,Completion Status,Note
@@ -980,7 +1164,6 @@ Sample Book,Sample Author,Sample Category,Sample Editor,1,Sample Publisher,2023,
         except Exception as e:
             # Log the error for debugging
             print(f"CSV template download error: {e}")
-            import traceback
             traceback.print_exc()
             return jsonify({'error': f'CSV template creation failed: {str(e)}'}), 500
 
@@ -990,7 +1173,6 @@ Sample Book,Sample Author,Sample Category,Sample Editor,1,Sample Publisher,2023,
         try:
             # Simple database connection test instead of importing from app
             try:
-                from sqlalchemy import text
                 db.session.execute(text('SELECT 1'))
                 db.session.commit()
             except Exception as db_error:
@@ -1029,78 +1211,53 @@ Sample Book,Sample Author,Sample Category,Sample Editor,1,Sample Publisher,2023,
 
     # Export books to CSV endpoint
     @app.route('/api/books/export-csv', methods=['GET'])
+    @use_replica
+    @coalesce
+    @retry_idempotent
     def export_books_to_csv():
-        import tempfile
-        import os
-        
         try:
             # Check database connection health first
-            from app import check_database_connection
             if not check_database_connection():
                 return jsonify({'error': 'Database connection issue, please try again'}), 503
                 
-            from flask import send_file
-            import csv
 
-            # Get all books
-            books = Book.query.all()
+            # Get all books (category/publisher names loaded in the same query)
+            books = Book.query.options(db.joinedload(Book.category), db.joinedload(Book.publisher)).all()
 
-            # Create temporary file in binary mode for better Unicode control
-            temp_file = tempfile.NamedTemporaryFile(mode='wb', suffix='.csv', delete=False)
-            
-            try:
-                # Write UTF-8 BOM manually for better Excel compatibility
-                temp_file.write(b'\xef\xbb\xbf')
-                
-                # Create CSV content in memory first
-                import io
-                csv_buffer = io.StringIO()
-                writer = csv.writer(csv_buffer)
-
-                # Write CSV header
-                headers = [
-                    'Book Name', 'Author', 'Category', 'Editor', 'Volumes', 
-                    'Publisher', 'Year', 'Copies', 'Status', 'Completion Status', 'Note'
+            # Build the CSV in memory so concurrent exports can share one result
+            csv_buffer = io.StringIO()
+            writer = csv.writer(csv_buffer)
+
+            # Write CSV header
+            headers = [
+                'Book Name', 'Author', 'Category', 'Editor', 'Volumes', 
+                'Publisher', 'Year', 'Copies', 'Status', 'Completion Status', 'Note'
+            ]
+            writer.writerow(headers)
+
+            # Write book data
+            for book in books:
+                row = [
+                    book.book_name or '',
+                    book.author or '',
+                    book.category.name if book.category else '',
+                    book.editor or '',
+                    book.volumes or 1,
+                    book.publisher.name if book.publisher else '',
+                    book.year or '',
+                    book.copies or 1,
+                    book.status or 'Available',
+                    book.completion_status or '',
+                    book.note or ''
                 ]
-                writer.writerow(headers)
-
-                # Write book data
-                for book in books:
-                    row = [
-                        book.book_name or '',
-                        book.author or '',
-                        book.category.name if book.category else '',
-                        book.editor or '',
-                        book.volumes or 1,
-                        book.publisher.name if book.publisher else '',
-                        book.year or '',
-                        book.copies or 1,
-                        book.status or 'Available',
-                        book.completion_status or '',
-                        book.note or ''
-                    ]
-                    writer.writerow(row)
-
-                # Write CSV content to file with UTF-8 encoding
-                csv_content = csv_buffer.getvalue()
-                temp_file.write(csv_content.encode('utf-8'))
-                temp_file.close()
-
-                # Serve the temporary file
-                return send_file(
-                    temp_file.name,
-                    as_attachment=True,
-                    download_name='library_books_export.csv',
-                    mimetype='text/csv; charset=utf-8'
-                )
+                writer.writerow(row)
 
-            finally:
-                # Clean up: delete the temporary file after serving
-                try:
-                    os.unlink(temp_file.name)
-                except OSError:
-                    # Ignore errors if file was already deleted
-                    pass
+            # UTF-8 BOM first for better Excel compatibility
+            return Response(
+                b'\xef\xbb\xbf' + csv_buffer.getvalue().encode('utf-8'),
+                mimetype='text/csv; charset=utf-8',
+                headers={'Content-Disposition': 'attachment; filename=library_books_export.csv'}
+            )
 
         except Exception as e:
             # Log the error for debugging
@@ -1118,44 +1275,58 @@ Sample Book,Sample Author,Sample Category,Sample Editor,1,Sample Publisher,2023,
             if not book_ids:
                 return jsonify({'error': 'No book IDs provided'}), 400
 
-            # Get books to be deleted for logging
-            books_to_delete = Book.query.filter(Book.id.in_(book_ids)).all()
-            deleted_count = len(books_to_delete)
-
-            if deleted_count == 0:
-                return jsonify({'error': 'No books found with provided IDs'}), 404
+            try:
+                book_ids = sorted({int(book_id) for book_id in book_ids})
+            except (TypeError, ValueError):
+                return jsonify({'error': 'Book IDs must be integers'}), 400
 
-            # Collect book names BEFORE deletion for logging
-            book_names = [book.book_name for book in books_to_delete]
+            # Only a handful of names are needed for the log message
+            book_names = [name for (name,) in db.session.query(Book.book_name)
+                          .filter(Book.id.in_(book_ids[:app.config['PURGE_CHUNK_SIZE']]))
+                          .order_by(Book.id).limit(6)]
 
-            # Delete all related issue history records first
-            from sqlalchemy import text
-            db.session.execute(text('DELETE FROM issue_history WHERE book_id IN :book_ids'), {'book_ids': tuple(book_ids)})
+            # Mark the books deleted right away (hidden from every read path);
+            # the rows and their issue history are removed by the background purger
+            deleted_count = soft_delete_books(book_ids, app.config['PURGE_CHUNK_SIZE'])
 
-            # Delete the books
-            Book.query.filter(Book.id.in_(book_ids)).delete(synchronize_session=False)
+            if deleted_count == 0:
+                db.session.rollback()
+                return jsonify({'error': 'No books found with provided IDs'}), 404
 
             db.session.commit()
+            on_commit(lambda: start_purge(app))
 
             # Log the bulk deletion
-            add_log_entry(f'Bulk deleted {deleted_count} books: {", ".join(book_names[:5])}{"..." if len(book_names) > 5 else ""}', 'Delete')
+            add_log_entry(f'Bulk deleted {deleted_count} books: {", ".join(book_names[:5])}{"..." if deleted_count > 5 else ""}', 'Delete',
+                          related=[('book', book_id) for book_id in book_ids[:app.config['BULK_LOG_LINKS']]],
+                          payload={'action': 'deleted', 'count': deleted_count})
 
             return jsonify({
                 'message': f'Successfully deleted {deleted_count} books',
-                'deleted_count': deleted_count
+                'deleted_count': deleted_count,
+                'purge': purge_status(scheduled=True)
             }), 200
 
         except Exception as e:
             db.session.rollback()
             return jsonify({'error': f'Bulk delete failed: {str(e)}'}), 500
 
+    # Progress of the background purge started by bulk delete
+    @app.route('/api/books/purge-status', methods=['GET'])
+    @token_required
+    def get_purge_status(current_user):
+        try:
+            return jsonify(purge_status())
+        except Exception as e:
+            print(f"Purge status error: {e}")
+            return jsonify({'error': 'Database connection issue, please try again'}), 503
+
     # Health check endpoint
     @app.route('/api/health', methods=['GET'])
     def health_check():
         try:
             # Simple database connection test
             try:
-                from sqlalchemy import text
                 db.session.execute(text('SELECT 1'))
                 db.session.commit()
                 db_healthy = True
@@ -1187,8 +1358,6 @@ Sample Book,Sample Author,Sample Category,Sample Editor,1,Sample Publisher,2023,
     def test_csv_template():
         """Simple test endpoint to verify CSV template functionality"""
         try:
-            import io
-            import csv
             
             # Create simple test data
             test_data = [
@@ -1217,44 +1386,64 @@ Sample Book,Sample Author,Sample Category,Sample Editor,1,Sample Publisher,2023,
                 'message': f'CSV template test failed: {str(e)}'
             }), 500
 
+    # Delta sync API
+    @app.route('/api/changes', methods=['GET'])
+    @retry_idempotent
+    def get_changes():
+        """Rows inserted, updated and deleted since ?since=<token>, and the token to use next"""
+        try:
+            # Check database connection health first
+            if not check_database_connection():
+                return jsonify({'error': 'Database connection issue, please try again'}), 503
+
+            try:
+                since = parse_since(request.args, app.config.get('CHANGES_RETENTION_DAYS', 30))
+            except ChangeTokenError as e:
+                return jsonify({'error': str(e)}), e.status_code
+
+            changes = changes_since(
+                since,
+                app.config.get('CHANGES_OVERLAP_SECONDS', 30),
+                app.config.get('CHANGES_MAX_ROWS', 5000)
+            )
+            if changes is None:
+                return jsonify({'error': 'Too many changes since this token; reload all data'}), 410
+            return jsonify(changes)
+        except Exception as e:
+            print(f"Changes API error: {e}")
+            return jsonify({'error': 'Database connection issue, please try again'}), 503
+
+    # Batch API: several GET endpoints in one round trip
+    @app.route('/api/batch', methods=['GET'])
+    def batch_requests():
+        """Run the ?path= GET endpoints on one session and return every result"""
+        try:
+            try:
+                paths = batch_paths(request.args, app.config.get('BATCH_MAX_REQUESTS', 20),
+                                    app.config.get('BATCH_ALLOWED_PATHS', ()))
+            except BatchError as e:
+                return jsonify({'error': str(e)}), 400
+
+            if not check_database_connection():
+                return jsonify({'error': 'Database connection issue, please try again'}), 503
+
+            return jsonify(run_batch(app, paths))
+        except Exception as e:
+            print(f"Batch API error: {e}")
+            return jsonify({'error': 'Database connection issue, please try again'}), 503
+
     # Application warming endpoint
     @app.route('/api/warm-up', methods=['GET'])
+    @coalesce
     def warm_up_application():
-        """Warm up the application by establishing database connections"""
+        """Warm up the pool, hot routes and lookup caches, reporting each step's time"""
         try:
             print("Application warm-up requested")
-            
-            # Test database connection
-            try:
-                from sqlalchemy import text
-                db.session.execute(text('SELECT 1'))
-                db.session.commit()
-                db_status = "connected"
-                print("Database connection established during warm-up")
-            except Exception as db_error:
-                db_status = f"error: {str(db_error)}"
-                print(f"Database connection failed during warm-up: {db_error}")
-            
-            # Test CSV creation
-            try:
-                import io
-                import csv
-                output = io.StringIO()
-                writer = csv.writer(output)
-                writer.writerow(['Test'])
-                csv_test = "success"
-                print("CSV creation test passed during warm-up")
-            except Exception as csv_error:
-                csv_test = f"error: {str(csv_error)}"
-                print(f"CSV creation test failed during warm-up: {csv_error}")
-            
-            return jsonify({
-                'status': 'warmed_up',
-                'message': 'Application warming completed',
-                'database': db_status,
-                'csv_functionality': csv_test,
-                'timestamp': datetime.now().isoformat()
-            })
+            report = run_warm_up(app, db)
+            # Pick up a purge that a restart interrupted
+            report['purge_resumed'] = resume_purge(app)
+            print(f"Application warm-up finished in {report['total_ms']} ms")
+            return jsonify(report)
             
         except Exception as e:
             print(f"Warm-up failed: {e}")
@@ -0,0 +1,56 @@
+#
+# Upgrades for the core tables on databases created by older releases
+#
+# create_all() only creates missing tables, so columns the models gained
+# later are added here; initialize_database() runs it on every schema
+# version bump (see bootstrap.SCHEMA_VERSION).
+#
+from sqlalchemy import case, func, select, update
+from .bootstrap import ensure_table_schema
+from .models import Book, Member, Category, Publisher, IssueHistory
+
+# Tables with an optimistic-concurrency version column
+VERSIONED_MODELS = (Book, Member, Category, Publisher)
+
+
+def ensure_core_schema(engine):
+    """Add the columns and indexes the core tables gained since they were first created"""
+    # book.deleted_at (soft delete) and its index, book.available_copies, the version columns
+    for model in VERSIONED_MODELS:
+        ensure_table_schema(engine, model.__table__)
+    backfill_available_copies(engine)
+    backfill_versions(engine)
+
+
+def backfill_versions(engine):
+    """Start rows from before optimistic concurrency at version 1 (NULL breaks their UPDATEs)"""
+    with engine.begin() as connection:
+        for model in VERSIONED_MODELS:
+            table = model.__table__
+            connection.execute(update(table).where(table.c.version.is_(None)).values(version=1))
+
+
+def backfill_available_copies(engine):
+    """Start available_copies at the copies owned minus the copies on loan (pending issue records)"""
+    book, history = Book.__table__, IssueHistory.__table__
+    on_loan = (
+        select(func.count(history.c.id))
+        .where(history.c.book_id == book.c.id, history.c.status == 'Pending')
+        .scalar_subquery()
+    )
+    on_shelf = func.coalesce(book.c.copies, 1) - on_loan
+    available = case((on_shelf < 0, 0), else_=on_shelf)
+    with engine.begin() as connection:
+        # status first, while the rows still to backfill are the ones with no available_copies
+        connection.execute(
+            update(book)
+            .where(book.c.available_copies.is_(None), book.c.status.in_(('Available', 'Issued')))
+            .values(status=case((available > 0, 'Available'), else_='Issued'))
+        )
+        result = connection.execute(
+            update(book)
+            .where(book.c.available_copies.is_(None))
+            .values(available_copies=available)
+        )
+    if result.rowcount:
+        print(f"Backfilled available_copies for {result.rowcount} books")
@@ -0,0 +1,60 @@
+#
+# Single-flight coalescing of identical concurrent GET requests
+#
+import threading
+from functools import wraps
+from flask import request, current_app, Response
+from .replica import wrote_recently
+from .wire_format import format_key
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class _Flight:
+    """One in-progress execution that followers wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None  # (body, status, headers) once the leader finishes
+
+
+def _request_key():
+    """Route + normalized query string (+ primary/replica choice and wire format, which change the response)"""
+    query = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+    return request.path, query, wrote_recently(), format_key(request)
+
+
+def coalesce(f):
+    """Let concurrent identical requests share one execution of an expensive read.
+
+    The first request runs the handler; requests with the same key that
+    arrive while it is running wait for it and reuse its response. If the
+    leader fails or takes longer than COALESCE_WAIT_SECONDS, followers run
+    the handler themselves.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        key = _request_key()
+        with _inflight_lock:
+            flight = _inflight.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = _inflight[key] = _Flight()
+
+        if not is_leader:
+            if flight.done.wait(current_app.config.get('COALESCE_WAIT_SECONDS', 30)) and flight.result:
+                body, status, headers = flight.result
+                return Response(body, status=status, headers=headers)
+            return f(*args, **kwargs)
+
+        try:
+            response = current_app.make_response(f(*args, **kwargs))
+            if response.status_code == 200 and not response.direct_passthrough and not response.is_streamed:
+                flight.result = (response.get_data(), response.status_code, list(response.headers))
+            return response
+        finally:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+            flight.done.set()
+    return decorated
@@ -0,0 +1,133 @@
+#
+# Per-endpoint database time budgets
+#
+# Each request gets a deadline from its route's budget. Every statement it
+# runs is limited to the time left: a MAX_EXECUTION_TIME hint on MySQL,
+# SET STATEMENT max_statement_time on MariaDB and a progress-handler abort
+# on SQLite. A runaway query fails fast instead of holding the only pooled
+# connection for the whole driver read_timeout.
+#
+import time
+from flask import g, request, jsonify, has_request_context
+from sqlalchemy import event
+
+# Error codes/messages the databases use for an aborted statement
+MYSQL_TIMEOUT_CODES = (3024, 1969)  # MySQL MAX_EXECUTION_TIME, MariaDB max_statement_time
+SQLITE_INTERRUPTED = 'interrupted'
+
+# SQLite checks the progress handler every this many VM instructions
+SQLITE_PROGRESS_STEPS = 10000
+
+
+class StatementBudgetExceeded(Exception):
+    """Raised before running a statement when the request's deadline has already passed"""
+
+
+def _remaining_seconds():
+    deadline = g.get('db_deadline') if has_request_context() else None
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def _limit_statement(conn, cursor, statement, parameters, context, executemany):
+    remaining = _remaining_seconds()
+    if remaining is None:
+        return statement, parameters
+    if remaining <= 0:
+        g.db_budget_exceeded = True
+        raise StatementBudgetExceeded(f'Database time budget exhausted before: {statement[:60]}')
+
+    dialect = conn.dialect
+    is_select = statement.lstrip()[:6].upper() == 'SELECT'
+    if dialect.name == 'mysql' and is_select:
+        if getattr(dialect, 'is_mariadb', False):
+            statement = f'SET STATEMENT max_statement_time={remaining:.3f} FOR {statement}'
+        else:
+            head, rest = statement.lstrip()[:6], statement.lstrip()[6:]
+            statement = f'{head} /*+ MAX_EXECUTION_TIME({max(int(remaining * 1000), 1)}) */{rest}'
+    elif dialect.name == 'sqlite':
+        _install_sqlite_deadline(conn.connection, g.db_deadline)
+    return statement, parameters
+
+
+def _install_sqlite_deadline(connection, deadline):
+    """Abort SQLite work past ``deadline``, including rows stepped after execute() returns.
+
+    Installed once per request and connection checkout; _clear_sqlite_deadline
+    removes it when the connection goes back to the pool or a statement fails.
+    """
+    if connection.info.get('db_deadline') == deadline:
+        return
+    connection.dbapi_connection.set_progress_handler(
+        lambda: 1 if time.monotonic() > deadline else 0, SQLITE_PROGRESS_STEPS
+    )
+    connection.info['db_deadline'] = deadline
+
+
+def _clear_sqlite_deadline(dbapi_connection, info):
+    if info.pop('db_deadline', None) is None:
+        return
+    try:
+        dbapi_connection.set_progress_handler(None, 0)
+    except Exception:
+        pass
+
+
+def _clear_on_checkin(dbapi_connection, connection_record):
+    """The next request using this pooled connection starts without the last one's deadline"""
+    if dbapi_connection is not None and connection_record is not None:
+        _clear_sqlite_deadline(dbapi_connection, connection_record.info)
+
+
+def _detect_timeout(context):
+    """Drop the SQLite deadline after any failed statement and flag statements aborted for the budget"""
+    if context.engine is not None and context.engine.dialect.name == 'sqlite' and context.connection is not None:
+        try:
+            proxied = context.connection.connection
+            _clear_sqlite_deadline(proxied.dbapi_connection, proxied.info)
+        except Exception:
+            pass
+
+    error = context.original_exception
+    code = error.args[0] if getattr(error, 'args', None) else None
+    timed_out = code in MYSQL_TIMEOUT_CODES or (
+        context.engine is not None and context.engine.dialect.name == 'sqlite'
+        and SQLITE_INTERRUPTED in str(error).lower()
+    )
+    if timed_out and has_request_context():
+        g.db_budget_exceeded = True
+
+
+def register_statement_timeouts(app, db):
+    """Give each request a database deadline and enforce it on every statement"""
+    budgets = app.config.get('STATEMENT_TIMEOUTS', {})
+    default_read_budget = app.config.get('STATEMENT_TIMEOUT_DEFAULT')
+
+    with app.app_context():
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', _limit_statement, retval=True)
+            event.listen(engine, 'handle_error', _detect_timeout)
+            if engine.dialect.name == 'sqlite':
+                event.listen(engine, 'checkin', _clear_on_checkin)
+
+    @app.before_request
+    def set_db_deadline():
+        if request.url_rule is None:
+            return
+        budget = budgets.get(f'{request.method} {request.url_rule.rule}')
+        if budget is None and request.method == 'GET':
+            budget = default_read_budget
+        if budget:
+            g.db_budget = budget
+            g.db_deadline = time.monotonic() + budget
+
+    @app.after_request
+    def explain_budget_exceeded(response):
+        if g.pop('db_budget_exceeded', False) and response.status_code >= 500:
+            response = jsonify({
+                'error': f'This request exceeded its {g.db_budget:g}s database time limit. '
+                         'Try narrower filters or a smaller page.'
+            })
+            response.status_code = 503
+        return response
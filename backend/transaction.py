@@ -0,0 +1,70 @@
+#
+# One transaction per request
+#
+# Mutating requests (POST/PUT/PATCH/DELETE) run as a single unit of work:
+# the handlers' db.session.commit() calls only flush, and the transaction is
+# committed once after the handler returns a success response (or rolled
+# back otherwise). Read-only requests never send COMMIT; their transaction
+# simply ends when the connection goes back to the pool.
+#
+from flask import g, request, jsonify, has_request_context
+from .replica import RoutingSession
+
+MUTATING_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+
+class UnitOfWorkSession(RoutingSession):
+    """Session whose commit() defers to the request's unit of work"""
+
+    def commit(self):
+        if has_request_context():
+            if g.get('unit_of_work'):
+                # Same visible effects as a commit inside the handler, minus the COMMIT
+                self.flush()
+                self.expire_all()
+                g.unit_of_work_commit = True
+                return
+            if request.method not in MUTATING_METHODS and not (self.new or self.dirty or self.deleted):
+                # Nothing to write on a read-only request: skip the COMMIT round trip
+                return
+        super().commit()
+
+
+def on_commit(callback):
+    """Run ``callback`` once the current request's work is committed (right away outside a unit of work)"""
+    if has_request_context() and g.get('unit_of_work'):
+        g.setdefault('unit_of_work_callbacks', []).append(callback)
+    else:
+        callback()
+
+
+def register_unit_of_work(app, db):
+    """Open a unit of work for every mutating request and commit it once at the end"""
+
+    @app.before_request
+    def begin_unit_of_work():
+        if request.method in MUTATING_METHODS:
+            g.unit_of_work = True
+
+    @app.after_request
+    def finish_unit_of_work(response):
+        if not g.pop('unit_of_work', False):
+            return response
+
+        callbacks = g.pop('unit_of_work_callbacks', [])
+        try:
+            if g.pop('unit_of_work_commit', False) and response.status_code < 400:
+                db.session.commit()
+            else:
+                db.session.rollback()
+                callbacks = []
+        except Exception as e:
+            print(f"Request transaction commit failed: {e}")
+            db.session.rollback()
+            response = jsonify({'error': f'Could not save changes: {str(e)}'})
+            response.status_code = 500
+            callbacks = []
+
+        for callback in callbacks:
+            callback()
+        return response
@@ -1,6 +1,8 @@
-from functools import wraps
+from functools import wraps, lru_cache
 import jwt
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, g, has_app_context
+from sqlalchemy import text
+from .extensions import db
 from .models import User
 
 def token_required(f):
@@ -18,5 +20,65 @@ def token_required(f):
             current_user = User.query.filter_by(id=data['user_id']).first()
         except Exception as e:
             return jsonify({'message' : 'Token is invalid!', 'error': str(e)}), 401
+        g.current_user = current_user  # the actor for activity log entries
         return f(current_user, *args, **kwargs)
     return decorated
+
+def entity_etag(entity):
+    """ETag value for a versioned model row"""
+    return f'{type(entity).__name__.lower()}-{entity.id}-v{entity.version}'
+
+def check_if_match(entity):
+    """Return a 409 response if the client's If-Match header names an older version.
+
+    The row is already loaded, so this costs no extra query; the version_id_col
+    WHERE clause on flush covers the window between load and commit.
+    """
+    if request.if_match and not request.if_match.contains(entity_etag(entity)):
+        response = jsonify({'error': 'This record was changed by someone else. Reload it and try again.'})
+        response.set_etag(entity_etag(entity))
+        return response, 409
+    return None
+
+def with_etag(response, entity):
+    """Attach the entity's current ETag to a JSON response"""
+    response.set_etag(entity_etag(entity))
+    return response
+
+def check_database_connection():
+    """Check if database connection is healthy and recover if needed.
+
+    Checked once per app context, so the sub-requests of /api/batch share one check.
+    """
+    if has_app_context() and g.get('database_checked'):
+        return True
+    try:
+        # Test the connection with a simple query using text()
+        db.session.execute(text('SELECT 1'))
+        db.session.commit()
+        if has_app_context():
+            g.database_checked = True
+        return True
+    except Exception as e:
+        print(f"Database connection check failed: {e}")
+        try:
+            # Attempt to recover with a fresh session (and connection); only the
+            # broken connection was invalidated, the rest of the pool stays
+            db.session.rollback()
+            db.session.remove()
+            # Test again after cleanup
+            db.session.execute(text('SELECT 1'))
+            db.session.commit()
+            print("Database connection recovered successfully")
+            if has_app_context():
+                g.database_checked = True
+            return True
+        except Exception as recovery_error:
+            print(f"Database connection recovery failed: {recovery_error}")
+            return False
+
+@lru_cache(maxsize=None)
+def load_openpyxl():
+    """Import openpyxl on first use (Excel import only); raises ImportError if it is not installed"""
+    import openpyxl
+    return openpyxl
@@ -0,0 +1,104 @@
+#
+# Compact columnar encoding for bulk list responses
+#
+# Clients opt in with ?format=compact|msgpack or an Accept header naming
+# COMPACT_MIMETYPE / MSGPACK_MIMETYPE; plain JSON stays the default. The
+# list is sent once as column names plus one array per row, and repetitive
+# columns (category, publisher, status...) are dictionary-encoded: the row
+# holds an index into a list of the distinct values. MessagePack needs the
+# optional msgpack package.
+#
+#   {"books": {"columns": ["library_id", "bookName", "category", ...],
+#              "rows": [[1, "Sahih Muslim", 0, ...], ...],
+#              "dictionaries": {"category": ["Hadith", ...]}},
+#    "total": 2400, ...}
+#
+from flask import current_app, jsonify
+
+from .json_provider import _default, dumps_bytes
+
+try:
+    import msgpack
+except ImportError:  # optional: pip install msgpack
+    msgpack = None
+
+COMPACT_MIMETYPE = 'application/vnd.lms.compact+json'
+MSGPACK_MIMETYPE = 'application/vnd.lms.compact+msgpack'
+MSGPACK_ALIASES = ('application/msgpack', 'application/x-msgpack')
+
+# Columns with few distinct values that repeat on every row
+DICTIONARY_KEYS = ('category', 'publisher', 'status', 'completion_status')
+ISSUE_DICTIONARY_KEYS = ('bookName', 'memberName', 'status')
+
+
+class WireFormatError(ValueError):
+    """?format= named an encoding this server cannot produce"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def requested_format(request):
+    """'json', 'compact' or 'msgpack' from ?format= or, failing that, the Accept header"""
+    name = request.args.get('format', '').strip().lower()
+    if name:
+        if name not in ('json', 'compact', 'msgpack'):
+            raise WireFormatError('format must be json, compact or msgpack')
+        if name == 'msgpack' and msgpack is None:
+            raise WireFormatError('MessagePack is not available on this server', 406)
+        return name
+
+    offered = ['application/json', COMPACT_MIMETYPE]
+    if msgpack is not None:
+        offered += [MSGPACK_MIMETYPE, *MSGPACK_ALIASES]
+    best = request.accept_mimetypes.best_match(offered, default='application/json')
+    if best == COMPACT_MIMETYPE:
+        return 'compact'
+    if best == MSGPACK_MIMETYPE or best in MSGPACK_ALIASES:
+        return 'msgpack'
+    return 'json'
+
+
+def format_key(request):
+    """The wire format a request resolves to, for cache and coalescing keys ('invalid' when it cannot be served)"""
+    try:
+        return requested_format(request)
+    except WireFormatError:
+        return 'invalid'
+
+
+def to_columns(items, dictionary_keys=DICTIONARY_KEYS):
+    """List of same-shaped dicts -> {'columns', 'rows', 'dictionaries'}"""
+    columns = list(items[0]) if items else []
+    dictionaries = {key: {} for key in dictionary_keys if key in columns}
+    encoded = [(columns.index(key), values) for key, values in dictionaries.items()]
+
+    rows = []
+    for item in items:
+        row = [item[column] for column in columns]
+        for position, values in encoded:
+            value = row[position]
+            if value is not None:
+                row[position] = values.setdefault(value, len(values))
+        rows.append(row)
+    return {
+        'columns': columns,
+        'rows': rows,
+        'dictionaries': {key: list(values) for key, values in dictionaries.items()}
+    }
+
+
+def encode_list_response(payload, items_key, wire_format, dictionary_keys=DICTIONARY_KEYS):
+    """Response for a list payload; ``payload[items_key]`` is columnar unless the format is json"""
+    if wire_format == 'json':
+        response = jsonify(payload)
+    else:
+        payload = dict(payload, **{items_key: to_columns(payload[items_key], dictionary_keys)})
+        if wire_format == 'msgpack':
+            body = msgpack.packb(payload, default=_default, use_bin_type=True)
+            response = current_app.response_class(body, mimetype=MSGPACK_MIMETYPE)
+        else:
+            response = current_app.response_class(dumps_bytes(payload), mimetype=COMPACT_MIMETYPE)
+    response.vary.add('Accept')
+    return response
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Performance Benchmark Script
+Measures startup and request costs and appends each result to
+benchmark_results.jsonl so numbers can be compared across releases.
+
+Usage:
+    python benchmark.py cold-start [--runs 5]
+    python benchmark.py compression [--runs 20] [--rows 100]
+    python benchmark.py json [--runs 50] [--rows 100]
+    python benchmark.py wire-format [--runs 20] [--rows 2000]
+    python benchmark.py checkout-race [--threads 12] [--copies 3]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_results.jsonl')
+
+
+def current_commit():
+    """Short git commit of the working tree, if available"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def record_result(name, values, unit, **extra):
+    """Print a summary and append it to the results file"""
+    result = {
+        'benchmark': name,
+        'timestamp': datetime.utcnow().isoformat(),
+        'commit': current_commit(),
+        'python': sys.version.split()[0],
+        'unit': unit,
+        'runs': len(values),
+        'median': round(statistics.median(values), 3),
+        'min': round(min(values), 3),
+        'max': round(max(values), 3),
+        **extra
+    }
+    print(f"✅ {name}: median {result['median']} {unit} "
+          f"(min {result['min']}, max {result['max']}, {len(values)} runs)")
+    with open(RESULTS_FILE, 'a', encoding='utf-8') as results:
+        results.write(json.dumps(result) + '\n')
+    return result
+
+
+def benchmark_cold_start(args):
+    """Time a fresh interpreter importing the app, plus its import profile"""
+    from backend.profiling import measure_cold_start, profile_imports
+
+    print("🔍 Measuring worker cold start...")
+    print("=" * 50)
+    timings = measure_cold_start('app', runs=args.runs)
+    wall, rows = profile_imports('app')
+    return record_result(
+        'cold_start', [t * 1000 for t in timings], 'ms',
+        modules_imported=len(rows),
+        import_ms=round(sum(row[0] for row in rows) / 1000, 1)
+    )
+
+
+def sample_payloads(rows):
+    """A books page as JSON and a books export as CSV, shaped like the real responses"""
+    import csv
+    import io
+
+    def sample_book(i):
+        return {
+            'id': i, 'library_id': i, 'book_name': f'Sample Book {i}', 'author': f'Author {i % 37}',
+            'category': ['Fiction', 'Science', 'History', 'ইতিহাস'][i % 4], 'editor': 'Editor Name',
+            'volumes': 1, 'publisher': ['Penguin', 'Oxford', 'বাংলা একাডেমি'][i % 3], 'year': 1950 + i % 70,
+            'copies': 1 + i % 3, 'available_copies': 1, 'status': 'Available', 'completion_status': 'Complete',
+            'note': f'Donated copy {i}, first edition with the original dust jacket' if i % 2 else '',
+            'created_at': '2024-01-01T10:00:00', 'updated_at': '2024-06-01T10:00:00', 'version': 1
+        }
+
+    books = [sample_book(i) for i in range(rows)]
+    page = json.dumps({'books': books, 'total': rows, 'pages': 1, 'current_page': 1}).encode('utf-8')
+
+    # The export is every book; use 20 pages' worth of distinct rows
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(list(books[0].keys()))
+    for i in range(rows * 20):
+        writer.writerow(list(sample_book(i).values()))
+    export = buffer.getvalue().encode('utf-8')
+    return {'books_page_json': page, 'export_csv': export}
+
+
+def benchmark_compression(args):
+    """Bytes saved and CPU cost per coding/level for typical JSON and CSV bodies"""
+    import time
+    from backend.compression import brotli, compress_body
+
+    print("🔍 Measuring response compression...")
+    print("=" * 50)
+    settings = [('gzip', {'COMPRESS_GZIP_LEVEL': level}) for level in (1, 6, 9)]
+    if brotli is not None:
+        settings += [('br', {'COMPRESS_BROTLI_QUALITY': quality}) for quality in (1, 4, 11)]
+    else:
+        print("⚠️  brotli not installed - measuring gzip only")
+
+    results = []
+    for payload_name, data in sample_payloads(args.rows).items():
+        for encoding, config in settings:
+            level = next(iter(config.values()))
+            cpu_ms = []
+            for _ in range(args.runs):
+                started = time.process_time()
+                compressed = compress_body(data, encoding, config)
+                cpu_ms.append((time.process_time() - started) * 1000)
+            results.append(record_result(
+                f'compression_{payload_name}_{encoding}{level}', cpu_ms, 'cpu ms',
+                original_bytes=len(data), compressed_bytes=len(compressed),
+                saved_percent=round(100 * (1 - len(compressed) / len(data)), 1)
+            ))
+            print(f"   {len(data):,} -> {len(compressed):,} bytes "
+                  f"({results[-1]['saved_percent']}% saved)")
+    return results
+
+
+def benchmark_json(args):
+    """Serialization CPU per response: the old path (isoformat per field, Flask's default
+    encoder) against the stdlib and orjson backends of FastJSONProvider"""
+    import time
+    from datetime import datetime, timedelta
+    from backend.json_provider import dumps_bytes, orjson
+
+    print("🔍 Measuring JSON serialization...")
+    print("=" * 50)
+    started_at = datetime(2024, 1, 1, 10, 0, 0, 123456)
+
+    def page(rows):
+        # to_dict() output as it is now: datetime values left as they are
+        books = json.loads(sample_payloads(rows)['books_page_json'])['books']
+        for i, book in enumerate(books):
+            book.update(created_at=started_at + timedelta(minutes=i), updated_at=started_at + timedelta(hours=i))
+        return {'books': books, 'total': rows, 'pages': 1, 'current_page': 1}
+
+    def before(payload):
+        # Previous path: to_dict() called isoformat() per field, then sort_keys + ensure_ascii json.dumps
+        books = [dict(book, created_at=book['created_at'].isoformat(), updated_at=book['updated_at'].isoformat())
+                 for book in payload['books']]
+        return json.dumps(dict(payload, books=books), sort_keys=True, ensure_ascii=True,
+                          separators=(',', ':')).encode('utf-8')
+
+    encoders = [('before_stdlib_sorted', before), ('stdlib', lambda p: dumps_bytes(p, backend='json'))]
+    if orjson is not None:
+        encoders.append(('orjson', lambda p: dumps_bytes(p, backend='orjson')))
+    else:
+        print("⚠️  orjson not installed - measuring the stdlib only")
+
+    payload = page(args.rows)
+    results = []
+    for name, encode in encoders:
+        cpu_ms = []
+        for _ in range(args.runs):
+            started = time.process_time()
+            body = encode(payload)
+            cpu_ms.append((time.process_time() - started) * 1000)
+        results.append(record_result(f'json_books_page_{name}', cpu_ms, 'cpu ms',
+                                     rows=args.rows, body_bytes=len(body)))
+    return results
+
+
+def benchmark_wire_format(args):
+    """Body size (raw and gzipped) and encode CPU of a full-catalog books list as
+    plain JSON, compact columnar JSON and compact MessagePack"""
+    import gzip
+    import time
+    from backend.json_provider import _default, dumps_bytes
+    from backend.wire_format import msgpack, to_columns
+
+    print("🔍 Measuring list wire formats...")
+    print("=" * 50)
+    payload = json.loads(sample_payloads(args.rows)['books_page_json'])
+
+    def compact(p):
+        return dict(p, books=to_columns(p['books']))
+
+    encoders = [
+        ('json', lambda p: dumps_bytes(p)),
+        ('compact', lambda p: dumps_bytes(compact(p))),
+    ]
+    if msgpack is not None:
+        encoders.append(('msgpack', lambda p: msgpack.packb(compact(p), default=_default, use_bin_type=True)))
+    else:
+        print("⚠️  msgpack not installed - measuring JSON encodings only")
+
+    results = []
+    for name, encode in encoders:
+        cpu_ms = []
+        for _ in range(args.runs):
+            started = time.process_time()
+            body = encode(payload)
+            cpu_ms.append((time.process_time() - started) * 1000)
+        gzipped = len(gzip.compress(body, 6))
+        results.append(record_result(f'wire_format_books_{name}', cpu_ms, 'cpu ms',
+                                     rows=args.rows, body_bytes=len(body), gzip_bytes=gzipped))
+        print(f"   {len(body):,} bytes, {gzipped:,} gzipped")
+    return results
+
+
+def benchmark_checkout_race(args):
+    """POST /api/books/<id>/issue for one book from many threads at once, on a
+    throwaway SQLite database, and check that exactly ``copies`` issues win"""
+    import tempfile
+    import threading
+    import time
+
+    print(f"🔍 Racing {args.threads} issue requests for {args.copies} copies...")
+    print("=" * 50)
+    with tempfile.TemporaryDirectory() as workdir:
+        # Never the configured database: the app is imported against a temp file
+        os.environ.update({
+            'APP_ENV': 'development',
+            'DATABASE_URL': f"sqlite:///{os.path.join(workdir, 'race.db')}",
+            'CACHE_PATH': os.path.join(workdir, 'cache.sqlite'),
+            'SCHEMA_MARKER_DIR': workdir,
+            'AUTO_BOOTSTRAP_DATABASE': 'true'
+        })
+        os.environ.pop('DATABASE_REPLICA_URL', None)
+        from app import app
+        from backend.extensions import db
+        from backend.models import Book, IssueHistory, Member
+
+        if not app.config['SQLALCHEMY_DATABASE_URI'].endswith(os.path.join(workdir, 'race.db')):
+            print("❌ The app is not using the temporary database; not running")
+            sys.exit(1)
+
+        client = app.test_client()
+        login = client.post('/api/login', json={'username': 'admin', 'password': 'admin123'})
+        headers = {'x-access-token': login.get_json()['token']}
+        with app.app_context():
+            member = Member.query.first()
+            member_name = member.name
+        created = client.post('/api/books', headers=headers, json={
+            'bookName': 'Checkout race (benchmark)', 'author': 'benchmark.py',
+            'category': 'Fiction', 'copies': args.copies
+        })
+        book_id = created.get_json()['library_id']
+
+        start = threading.Barrier(args.threads)
+        statuses, timings = [], []
+        result_lock = threading.Lock()
+
+        def issue():
+            thread_client = app.test_client()
+            start.wait()
+            started = time.perf_counter()
+            response = thread_client.post(f'/api/books/{book_id}/issue', headers=headers, json={
+                'memberName': member_name, 'issueDate': '2026-01-01', 'returnDate': '2026-01-15'
+            })
+            with result_lock:
+                statuses.append(response.status_code)
+                timings.append((time.perf_counter() - started) * 1000)
+
+        threads = [threading.Thread(target=issue) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with app.app_context():
+            available = db.session.get(Book, book_id).available_copies
+            loans = IssueHistory.query.filter_by(book_id=book_id).count()
+            db.session.remove()
+            db.engine.dispose()
+
+    issued = statuses.count(201)
+    result = record_result('checkout_race', timings, 'ms', threads=args.threads, copies=args.copies,
+                           issued=issued, available_after=available, issue_records=loans)
+    print(f"   responses: { {status: statuses.count(status) for status in sorted(set(statuses))} }")
+    if issued != args.copies or available != 0 or loans != args.copies:
+        print(f"❌ {issued} of {args.threads} issues won for {args.copies} copies, "
+              f"{available} left on the shelf, {loans} issue records")
+        sys.exit(1)
+    print(f"   {issued} issues won, none left on the shelf, {loans} issue records")
+    return result
+
+
+def main():
+    """Main benchmark entry point"""
+    parser = argparse.ArgumentParser(description='Library Management System benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    cold_start = commands.add_parser('cold-start', help='worker import time')
+    cold_start.add_argument('--runs', type=int, default=5)
+    cold_start.set_defaults(run=benchmark_cold_start)
+
+    compression = commands.add_parser('compression', help='response compression ratio and CPU cost')
+    compression.add_argument('--runs', type=int, default=20)
+    compression.add_argument('--rows', type=int, default=100, help='books per JSON page')
+    compression.set_defaults(run=benchmark_compression)
+
+    json_encoding = commands.add_parser('json', help='JSON serialization cost per response')
+    json_encoding.add_argument('--runs', type=int, default=50)
+    json_encoding.add_argument('--rows', type=int, default=100, help='books per page')
+    json_encoding.set_defaults(run=benchmark_json)
+
+    wire_format = commands.add_parser('wire-format', help='size of plain vs compact list encodings')
+    wire_format.add_argument('--runs', type=int, default=20)
+    wire_format.add_argument('--rows', type=int, default=2000, help='books in the list')
+    wire_format.set_defaults(run=benchmark_wire_format)
+
+    checkout_race = commands.add_parser('checkout-race', help='concurrent checkouts of one book (correctness check)')
+    checkout_race.add_argument('--threads', type=int, default=12)
+    checkout_race.add_argument('--copies', type=int, default=3)
+    checkout_race.set_defaults(run=benchmark_checkout_race)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,7 @@ class LibraryManagementSystem {
         this.currentPage = 1;
         this.itemsPerPage = 100;
         this.currentFilters = {};
+        this.changeToken = null; // from /api/changes, for syncChanges()
         
         // API Configuration - Use relative URL when served from same server
         this.apiBaseUrl = '/api';
@@ -103,18 +104,32 @@ class LibraryManagementSystem {
     // API Data Loading
     async loadDataFromAPI() {
         try {
-            // Load dashboard data first
-            await this.loadDashboardData();
+            // Everything the app opens with, in one round trip
+            const results = await this.apiBatch({
+                // First, so the token is cut before the lists are read
+                changes: '/changes',
+                dashboard: '/dashboard',
+                books: `/books?page=1&per_page=${this.itemsPerPage}&format=compact`,
+                members: '/members',
+                categories: '/categories',
+                publishers: '/publishers',
+                issueHistory: '/issue-history?format=compact',
+                libraryLog: '/library-log'
+            });
             
-            // Load other data
-            await Promise.all([
-                this.loadBooks(),
-                this.loadMembers(),
-                this.loadCategories(),
-                this.loadPublishers(),
-                this.loadIssueHistory(),
-                this.loadLibraryLog()
-            ]);
+            this.changeToken = results.changes ? results.changes.token : null;
+            this.dashboardData = results.dashboard;
+            const books = results.books || {};
+            this.books = books.books || [];
+            this.totalBooks = books.total || 0;
+            this.totalPages = books.pages || 1;
+            this.currentPage = books.current_page || 1;
+            this.updatePagination(this.totalBooks);
+            this.members = results.members || [];
+            this.categories = results.categories || [];
+            this.publishers = results.publishers || [];
+            this.issueHistory = (results.issueHistory || {}).history || [];
+            this.libraryLog = (results.libraryLog || {}).logs || [];
             
             // Update UI after all data is loaded
             this.updateDashboard();
@@ -148,7 +163,9 @@ class LibraryManagementSystem {
                 throw new Error(errorData.error || `HTTP error! status: ${response.status}`);
             }
             
-            return await response.json();
+            const data = await response.json();
+            const contentType = response.headers.get('Content-Type') || '';
+            return contentType.startsWith('application/vnd.lms.compact+json') ? this.expandCompact(data) : data;
         } catch (error) {
             console.error(`API call failed for ${endpoint}:`, error);
             
@@ -156,6 +173,90 @@ class LibraryManagementSystem {
         }
     }
 
+    // Bring the loaded lists up to date from /api/changes instead of downloading them again
+    async syncChanges() {
+        if (!this.changeToken) {
+            await Promise.all([this.loadMembers(), this.loadCategories(), this.loadPublishers()]);
+            return;
+        }
+
+        let data;
+        try {
+            data = await this.apiCall(`/changes?since=${this.changeToken}`);
+        } catch (error) {
+            // Token expired or too much changed: start over with full lists
+            console.log('Change sync not possible, reloading all data');
+            this.changeToken = null;
+            await this.loadDataFromAPI();
+            return;
+        }
+        this.changeToken = data.token;
+
+        const merge = (list, changes, idKey) => {
+            const removed = new Set(changes.deleted);
+            const changed = new Map([...changes.inserted, ...changes.updated].map(item => [item[idKey], item]));
+            const merged = list
+                .filter(item => !removed.has(item[idKey]))
+                .map(item => {
+                    const latest = changed.get(item[idKey]);
+                    changed.delete(item[idKey]);
+                    return latest || item;
+                });
+            return merged.concat([...changed.values()]);
+        };
+        this.members = merge(this.members, data.changes.members, 'id');
+        this.categories = merge(this.categories, data.changes.categories, 'id');
+        this.publishers = merge(this.publishers, data.changes.publishers, 'id');
+
+        // Books and issue history are paged: refresh the rows already on screen.
+        // A row created inside the overlap window comes back as inserted even if edited since.
+        const refresh = (list, changes, idKey) => {
+            const changed = new Map([...changes.inserted, ...changes.updated].map(item => [item[idKey], item]));
+            return list.map(item => changed.get(item[idKey]) || item);
+        };
+        this.books = refresh(this.books, data.changes.books, 'library_id');
+        this.issueHistory = refresh(this.issueHistory, data.changes.issue_history, 'id');
+    }
+
+    // Several GET endpoints in one /api/batch request; failed ones come back as null
+    async apiBatch(endpoints) {
+        const keys = Object.keys(endpoints);
+        const query = keys.map(key => `path=${encodeURIComponent(this.apiBaseUrl + endpoints[key])}`).join('&');
+        const data = await this.apiCall(`/batch?${query}`);
+        const results = {};
+        data.responses.forEach((response, index) => {
+            if (response.status >= 400) {
+                console.error(`Batch request failed for ${response.path}:`, response.body.error);
+                results[keys[index]] = null;
+            } else if ((response.content_type || '').startsWith('application/vnd.lms.compact+json')) {
+                results[keys[index]] = this.expandCompact(response.body);
+            } else {
+                results[keys[index]] = response.body;
+            }
+        });
+        return results;
+    }
+
+    // Turn compact (?format=compact) list tables back into arrays of objects
+    expandCompact(data) {
+        Object.keys(data).forEach(key => {
+            const table = data[key];
+            if (!table || !Array.isArray(table.columns) || !Array.isArray(table.rows)) {
+                return;
+            }
+            const dictionaries = table.dictionaries || {};
+            data[key] = table.rows.map(row => {
+                const item = {};
+                table.columns.forEach((column, index) => {
+                    const value = row[index];
+                    item[column] = dictionaries[column] && value !== null ? dictionaries[column][value] : value;
+                });
+                return item;
+            });
+        });
+        return data;
+    }
+
     // Load Dashboard Data
     async loadDashboardData() {
         try {
@@ -170,7 +271,7 @@ class LibraryManagementSystem {
     // Load Books with Server-Side Pagination
     async loadBooks(page = 1) {
         try {
-            const data = await this.apiCall(`/books?page=${page}&per_page=${this.itemsPerPage}`);
+            const data = await this.apiCall(`/books?page=${page}&per_page=${this.itemsPerPage}&format=compact`);
             this.books = data.books || [];
             this.totalBooks = data.total || 0;
             this.totalPages = data.pages || 1;
@@ -190,7 +291,7 @@ class LibraryManagementSystem {
     async loadBooksWithFilters(page = 1) {
         try {
             // Build query string with filters
-            let queryString = `page=${page}&per_page=${this.itemsPerPage}`;
+            let queryString = `page=${page}&per_page=${this.itemsPerPage}&format=compact`;
             
             // Add filter parameters
             Object.keys(this.currentFilters).forEach(key => {
@@ -251,7 +352,7 @@ class LibraryManagementSystem {
     // Load Issue History
     async loadIssueHistory() {
         try {
-            const data = await this.apiCall('/issue-history');
+            const data = await this.apiCall('/issue-history?format=compact');
             this.issueHistory = data.history || [];
         } catch ( error) {
             console.error('Failed to load issue history:', error);
@@ -699,13 +800,15 @@ class LibraryManagementSystem {
                 <td>${book.note || '-'}</td>
                 <td>
                     <div class="action-buttons">
-                        ${book.status === 'Available' ?
+                        ${this.copiesOnShelf(book) > 0 ?
                             `<button class="btn btn-primary btn-sm" onclick="lms.issueBook(${book.library_id || book.id})" title="Issue Book">
                                 <i class="fas fa-share"></i>
-                            </button>` :
+                            </button>` : ''
+                        }
+                        ${this.copiesOnShelf(book) < (book.copies || 1) ?
                             `<button class="btn btn-secondary btn-sm" onclick="lms.returnBook(${book.library_id || book.id})" title="Return Book">
                                 <i class="fas fa-undo"></i>
-                            </button>`
+                            </button>` : ''
                         }
                         <button class="btn btn-secondary btn-sm" onclick="lms.editBook(${book.library_id || book.id})" title="Edit Book">
                             <i class="fas fa-edit"></i>
@@ -803,7 +906,7 @@ class LibraryManagementSystem {
                         await this.apiCall(`/members/${id}`, { method: 'DELETE' });
                     }
                     
-                    await this.loadMembers();
+                    await this.syncChanges();
                     this.renderMembersList();
                     this.showModal('Success', `<p>${selectedNames.length} member(s) deleted successfully!</p>`, () => this.closeModal());
                 } catch (error) {
@@ -835,7 +938,7 @@ class LibraryManagementSystem {
                         await this.apiCall(`/categories/${id}`, { method: 'DELETE' });
                     }
                     
-                    await this.loadCategories();
+                    await this.syncChanges();
                     this.renderCategoriesList();
                     this.showModal('Success', `<p>${selectedNames.length} category(ies) deleted successfully!</p>`, () => this.closeModal());
                 } catch (error) {
@@ -867,7 +970,7 @@ class LibraryManagementSystem {
                         await this.apiCall(`/publishers/${id}`, { method: 'DELETE' });
                     }
                     
-                    await this.loadPublishers();
+                    await this.syncChanges();
                     this.renderPublishersList();
                     this.showModal('Success', `<p>${selectedNames.length} publisher(s) deleted successfully!</p>`, () => this.closeModal());
                 } catch (error) {
@@ -1039,6 +1142,14 @@ class LibraryManagementSystem {
         });
     }
 
+    // Copies on the shelf; status alone stays 'Available' until the last copy is out
+    copiesOnShelf(book) {
+        if (typeof book.available_copies === 'number') {
+            return book.available_copies;
+        }
+        return book.status === 'Available' ? (book.copies || 1) : 0;
+    }
+
     returnBook(bookId) {
         const book = this.books.find(b => (b.library_id || b.id) === bookId);
         const issueRecord = this.issueHistory.find(ih => ih.bookName === book.bookName && ih.status === 'Pending');
@@ -1065,7 +1176,8 @@ class LibraryManagementSystem {
                     const response = await this.apiCall(`/books/${book.library_id || book.id}/return`, {
                         method: 'POST',
                         body: JSON.stringify({
-                            actualReturnDate: actualReturnDate
+                            actualReturnDate: actualReturnDate,
+                            issueId: issueRecord.id
                         })
                     });
 
@@ -1335,7 +1447,8 @@ class LibraryManagementSystem {
                     await this.apiCall(`/books/${book.id}/return`, {
                         method: 'POST',
                         body: JSON.stringify({
-                            actualReturnDate: actualReturnDate
+                            actualReturnDate: actualReturnDate,
+                            issueId: record.id
                         })
                     });
 
@@ -1472,7 +1585,7 @@ class LibraryManagementSystem {
                         })
                     });
                     
-                    await this.loadMembers();
+                    await this.syncChanges();
                     this.renderMembersList();
                     
                     this.showModal('Success', `<p>Member "${name}" renamed to "${newName}" successfully!</p>`, () => this.closeModal());
@@ -1500,7 +1613,7 @@ class LibraryManagementSystem {
                     method: 'DELETE'
                 });
                 
-                await this.loadMembers();
+                await this.syncChanges();
                 this.renderMembersList();
                 this.showModal('Success', `<p>Member "${name}" deleted successfully!</p>`, () => this.closeModal());
                 
@@ -1590,7 +1703,7 @@ class LibraryManagementSystem {
                         })
                     });
                     
-                    await this.loadCategories();
+                    await this.syncChanges();
                     this.renderCategoriesList();
                     
                     this.showModal('Success', `<p>Category "${name}" renamed to "${newName}" successfully!</p>`, () => this.closeModal());
@@ -1618,7 +1731,7 @@ class LibraryManagementSystem {
                     method: 'DELETE'
                 });
                 
-                await this.loadCategories();
+                await this.syncChanges();
                 this.renderCategoriesList();
                 this.showModal('Success', `<p>Category "${name}" deleted successfully!</p>`, () => this.closeModal());
                 
@@ -1707,7 +1820,7 @@ class LibraryManagementSystem {
                         })
                     });
                     
-                    await this.loadPublishers();
+                    await this.syncChanges();
                     this.renderPublishersList();
                     
                     this.showModal('Success', `<p>Publisher "${name}" renamed to "${newName}" successfully!</p>`, () => this.closeModal());
@@ -1734,7 +1847,7 @@ class LibraryManagementSystem {
                     method: 'DELETE'
                 });
                 
-                await this.loadPublishers();
+                await this.syncChanges();
                 this.renderPublishersList();
                 this.showModal('Success', `<p>Publisher "${name}" deleted successfully!</p>`, () => this.closeModal());
                 
@@ -1785,13 +1898,13 @@ class LibraryManagementSystem {
 
             // Reload the appropriate data and render the list
             if (itemType === 'category') {
-                await this.loadCategories();
+                await this.syncChanges();
                 this.renderCategoriesList();
             } else if (itemType === 'member') {
-                await this.loadMembers();
+                await this.syncChanges();
                 this.renderMembersList();
             } else if (itemType === 'publisher') {
-                await this.loadPublishers();
+                await this.syncChanges();
                 this.renderPublishersList();
             }
             input.value = '';
@@ -1817,7 +1930,7 @@ class LibraryManagementSystem {
                     method: 'DELETE'
                 });
                 
-                await this.loadPublishers();
+                await this.syncChanges();
                 this.renderPublishersList();
                 this.showModal('Success', `<p>Publisher "${name}" deleted successfully!</p>`, () => this.closeModal());
                 
@@ -18,7 +18,9 @@ class I18n {
 
     async loadLanguage(lang) {
         try {
-            const response = await fetch(`js/languages/${lang}.json`);
+            // Built pages map language files to their fingerprinted names
+            const path = `js/languages/${lang}.json`;
+            const response = await fetch((window.ASSET_MANIFEST || {})[path] || path);
             if (!response.ok) {
                 throw new Error(`Failed to load language file: ${lang}`);
             }